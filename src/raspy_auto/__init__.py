@@ -1,5 +1,10 @@
-import raspy_auto.ras.ras as ras
-import raspy_auto.api.api as api
+# Submodules are imported on first use (see lazy.py), so that importing raspy_auto is fast and does not need the
+# HEC-RAS controller libraries
+from raspy_auto.lazy import lazyExports
 
-from raspy_auto.ras import Ras
-from raspy_auto.api import API
\ No newline at end of file
+lazyExports(globals(), {
+    "ras": ("raspy_auto.ras.ras", None),
+    "api": ("raspy_auto.api.api", None),
+    "Ras": ("raspy_auto.ras.ras", "Ras"),
+    "API": ("raspy_auto.api.api", "API")
+})
@@ -1 +1,3 @@
-from raspy_auto.api.api import API
\ No newline at end of file
+from raspy_auto.lazy import lazyExports
+
+lazyExports(globals(), {"API": ("raspy_auto.api.api", "API")}, fallback = "raspy_auto.api.api")
@@ -13,13 +13,23 @@ rasObj.reach(river, reach, geom = None) - returning the relevant reach.  If geom
 rasObj.openProject(projectPath) - open the relevant project
 rasObj.setPlan(plan) - set the plan to that one (by ID or file number)
 rasObj.setGeom(geom) - set the plan geometry file/active geometry file (by ID or file number)
-rasObj.computeSteady, computeUnsteady(plan = None) - run the plan (optional) or, if plan is None, the currently active plan
+rasObj.computeSteady, computeUnsteady(plan = None, blocking = True) - run the plan (optional) or, if plan is None, the
+    currently active plan, returning the controller's result (success, number of messages, (messages), blocking mode).
+    If not blocking, return once the run has started; rasObj.computeIsComplete() tells when it has finished.
 rasObj.exit() - exit HEC-RAS
 rasObj.newPlan(planId) - create a new plan with the given ID and make it the active plan
 rasObj.set<Steady/Unsteady>Flow(flow) - set the steady/unsteady flow file (by ID or file number)
 rasObj.getSimData(river = None, reach = None, rs = None): get the simulation flow data for a given river, reach, and river station.
     If rs is none, return a dictionary of all the river stations' data.  Likewise river and reach (nested dictionaries).
     Simulation flow data should be as a simdata class.
+rasObj.getResultsArray(variables = None, profiles = 1, river = None, reach = None, rs = None): get the given variables
+    (velocity, maxDepth, flow, shear, area, wp) for many cross sections and profiles as arrays of shape
+    (profile, xs, L/C/R).  Should return a ResultArrays object (see ras/results.py).
+rasObj.reachKeys(river = None, reach = None): list the (river, reach) pairs matching the given arguments, in order.
+rasObj.readFile(path), writeFile(path, text): read (None if missing) or write a project file, e.g. the flow file
+rasObj.getTimeSeries(variables = None, river = None, reach = None, rs = None, start = None, end = None): get unsteady
+    time series (wse, flow, velocity) over a window of output time steps as arrays of shape (time, xs), as a
+    TimeSeries object (see ras/results.py); iterTimeSeries(..., chunk) generates them in chunks of time steps.
 
 reach - containing a reach in the geometry file
 reach.xses - return a list of cross sections
@@ -32,8 +42,96 @@ xs.setAllManning(ns): set all Manning's ns to a list of ns given
 xs.setMainChannelManning(n): set the main channel n to the given n
 """
 
-from pyrasfile import profileWriter as pw
+from raspy_auto.ras.geometry import GeometryFile
+from raspy_auto.ras.instrument import apiOperations
+from raspy_auto.ras.results import RatingCurve
+from raspy_auto.ras.store import scenarioKey
+import asyncio
+import numpy as np
+import os
+import time
+from collections import OrderedDict
 
+# Maximum number of profiles HEC-RAS accepts in a steady flow file
+MAX_PROFILES = 2000
+
+class ComputeCancelled(Exception):
+    pass
+
+class ComputeFailed(Exception):
+    """
+    A compute run that HEC-RAS reported as unsuccessful; messages holds the messages it returned.
+    """
+    def __init__(self, messages):
+        Exception.__init__(self, "Compute failed: %s" % "; ".join(messages))
+        self.messages = messages
+
+class ComputeStats(object):
+    """
+    Timing of a compute run: elapsed time (seconds), number of completion checks, and whether it completed; also
+    the result of starting the run (result) and the messages it returned (messages, a tuple of strings).
+    """
+    def __init__(self, start, result = None):
+        self.start = start
+        self.elapsed = 0.0
+        self.polls = 0
+        self.complete = False
+        self.result = result
+        self.messages = computeMessages(result)
+
+def computeMessages(result):
+    # Messages from a Compute_CurrentPlan result, (success, nmsg, (messages), blocking mode)
+    try:
+        return tuple(result[2]) if result[2] is not None else ()
+    except (TypeError, IndexError):
+        return ()
+
+def computeSucceeded(result):
+    # Success flag of a Compute_CurrentPlan result; a result without one (e.g. from another backend) counts as success
+    try:
+        return bool(result[0])
+    except (TypeError, IndexError):
+        return True
+
+def waitFor(done, stats, timeout = None, cancel = None, interval = 0.01, maxInterval = 1.0, backoff = 1.5):
+    """
+    Poll done() until it returns True, sleeping between checks with exponential backoff.  Updates stats (a
+    ComputeStats) as it goes.
+    :raises TimeoutError: if timeout (seconds since stats.start) is exceeded
+    :raises ComputeCancelled: if cancel.is_set() becomes true
+    """
+    while True:
+        stats.polls += 1
+        stats.complete = bool(done())
+        stats.elapsed = time.monotonic() - stats.start
+        if stats.complete:
+            return stats
+        if cancel is not None and cancel.is_set():
+            raise ComputeCancelled("Compute cancelled after %.1f s" % stats.elapsed)
+        if timeout is not None and stats.elapsed + interval > timeout:
+            raise TimeoutError("Compute did not complete within %.1f s" % timeout)
+        time.sleep(interval)
+        interval = min(interval * backoff, maxInterval)
+
+async def waitForAsync(done, stats, timeout = None, cancel = None, interval = 0.01, maxInterval = 1.0, backoff = 1.5):
+    """
+    As waitFor, but sleeping with asyncio, so that the event loop can run other tasks between checks.  done() is
+    called on the event loop's thread.
+    """
+    while True:
+        stats.polls += 1
+        stats.complete = bool(done())
+        stats.elapsed = time.monotonic() - stats.start
+        if stats.complete:
+            return stats
+        if cancel is not None and cancel.is_set():
+            raise ComputeCancelled("Compute cancelled after %.1f s" % stats.elapsed)
+        if timeout is not None and stats.elapsed + interval > timeout:
+            raise TimeoutError("Compute did not complete within %.1f s" % timeout)
+        await asyncio.sleep(interval)
+        interval = min(interval * backoff, maxInterval)
+
+@apiOperations("ops")
 class OpsAPI(object):
     # Running and general operation
     def __init__(self, rasObj):
@@ -44,14 +142,78 @@ class OpsAPI(object):
         self.ras.setPlan(plan)
     def setGeometry(self, geom):
         self.ras.setGeom(geom)
-    def compute(self, steady = True, plan = None, wait = True):
+    def compute(self, steady = True, plan = None, wait = True, timeout = None, cancel = None,
+                pollInterval = 0.01, maxPollInterval = 1.0):
+        """
+        Run the model.  When waiting, or given a timeout or cancel, the run is started in HEC-RAS's non-blocking mode
+        and its completion polled, so that it can be timed out or cancelled; otherwise, HEC-RAS's own (blocking)
+        compute is used.
+        :param wait: whether to wait for the run to complete before returning
+        :param timeout: maximum time to wait, in seconds.  If exceeded, the run is cancelled and TimeoutError raised.
+        :param cancel: optional object with an is_set() method (e.g. threading.Event); if it becomes set while
+            waiting, the run is cancelled and ComputeCancelled raised
+        :param pollInterval: initial time between completion checks, in seconds.  This grows exponentially up to
+            maxPollInterval, so short runs return quickly and long runs don't keep a core busy.
+        self.lastCompute holds the compute messages and, after waiting, the elapsed time and number of completion
+        checks (ComputeStats).
+        """
+        start = time.monotonic()
+        blocking = not wait and timeout is None and cancel is None
         if steady:
-            self.ras.computeSteady(plan)
+            result = self.ras.computeSteady(plan, blocking = blocking)
         else:
-            self.ras.computeUnsteady(plan)
-        if wait:
-            while not self.ras.computeIsComplete():
-                pass
+            result = self.ras.computeUnsteady(plan, blocking = blocking)
+        self.lastCompute = ComputeStats(start, result)
+        # A run that failed to start never completes
+        if wait and computeSucceeded(result):
+            try:
+                waitFor(self.ras.computeIsComplete, self.lastCompute, timeout, cancel, pollInterval, maxPollInterval)
+            except (TimeoutError, ComputeCancelled):
+                self.ras.cancelCompute()
+                raise
+    def computeAsync(self, steady = True, plan = None, timeout = None, cancel = None, pollInterval = 0.01,
+                     maxPollInterval = 1.0):
+        """
+        Start the model run and return an awaitable for its completion, so that other work (e.g. preparing the next
+        scenario, or waiting on other controllers with asyncio.gather) can proceed while it computes:
+
+            pending = api.ops.computeAsync()
+            ...  # prepare the next run
+            stats = await pending
+
+        The run is started in HEC-RAS's non-blocking mode, so this returns as soon as it has started.  Completion is
+        polled with backoff on the event loop's thread, which must be the thread that owns the
+        controller.  The awaitable resolves to a ComputeStats, with the elapsed time and the compute messages; it is
+        also self.lastCompute.
+        :param timeout, cancel, pollInterval, maxPollInterval: as for compute.  On timeout, cancellation (including
+            cancellation of the awaiting task), the run is cancelled and the error raised.
+        """
+        start = time.monotonic()
+        if steady:
+            result = self.ras.computeSteady(plan, blocking = False)
+        else:
+            result = self.ras.computeUnsteady(plan, blocking = False)
+        stats = ComputeStats(start, result)
+        self.lastCompute = stats
+        instrumentation = getattr(getattr(self.ras, "ras", None), "instrumentation", None)
+
+        def call(func):
+            # Attribute the calls made later from the event loop to this operation
+            if instrumentation is None:
+                return func()
+            with instrumentation.operation("ops.computeAsync"):
+                return func()
+
+        async def finish():
+            if not computeSucceeded(result):
+                return stats
+            try:
+                return await waitForAsync(lambda: call(self.ras.computeIsComplete), stats, timeout, cancel,
+                                          pollInterval, maxPollInterval)
+            except (TimeoutError, ComputeCancelled, asyncio.CancelledError):
+                call(self.ras.cancelCompute)
+                raise
+        return finish()
     def quit(self):
         self.ras.quit()
     def newPlan(self, planId):
@@ -71,20 +233,68 @@ def nestedDictMap(map, func):
     else:
         return func(map)
 
+@apiOperations("data")
 class DataAPI(object):
     # Data retrieval
-    def __init__(self, rasObj):
+    def __init__(self, rasObj, reader = None, ops = None, params = None, store = None):
+        # reader: optional alternative result backend with the same result methods as rasObj (getResultsArray,
+        # getSimData, getLCRSimData), e.g. a ResultReader reading the plan output file directly
+        # ops, params: OpsAPI and ParamsAPI, for operations that run the model (ratingCurve); set by API
+        # store: optional ResultStore (see ras/store.py) of results by scenario, used by computeResults
         self.ras = rasObj
+        self.results = rasObj if reader is None else reader
+        self.ops = ops
+        self.params = params
+        self.store = store
+    def table(self, river = None, reach = None, rs = None, nprofs = 1, variables = None):
+        # All results (or the given variables) as a columnar ResultArrays, without building nested dictionaries
+        return self.results.getResultsArray(variables, range(1, nprofs + 1), river, reach, rs)
+    def iterResults(self, variables = None, profiles = 1, chunk = 1, by = "profile", river = None, reach = None,
+                    rs = None):
+        """
+        Generate results (ResultArrays) in chunks as they are read, rather than all at once, so that consumers can
+        process them at bounded memory.
+        :param variables: as for getResultsArray; None for all
+        :param profiles: profile number or list of profile numbers
+        :param chunk: number of profiles per chunk
+        :param by: "profile" to yield all the selected cross sections for each chunk of profiles, or "reach" to yield
+            each reach separately (for each chunk of profiles)
+        :param river, reach, rs: as for getResultsArray; None means all
+        """
+        profiles = [profiles] if isinstance(profiles, int) else list(profiles)
+        if by == "profile":
+            locations = [(river, reach)]
+        elif by == "reach":
+            locations = self.results.reachKeys(river, reach)
+        else:
+            raise ValueError("by must be 'profile' or 'reach', not %r" % (by,))
+        for riv, rch in locations:
+            for start in range(0, len(profiles), chunk):
+                result = self.results.getResultsArray(variables, profiles[start:start + chunk], riv, rch, rs)
+                if len(result.index) > 0:
+                    yield result
+    def timeSeries(self, variables = None, river = None, reach = None, rs = None, start = None, end = None):
+        # Unsteady time series (wse, i.e. water surface elevation, flow, velocity) as (time, xs) arrays over a window
+        # of output time steps.  Unlike stage, which gives maximum depth, wse is an elevation.
+        return self.results.getTimeSeries(variables, river, reach, rs, start, end)
+    def iterTimeSeries(self, variables = None, river = None, reach = None, rs = None, start = None, end = None,
+                       chunk = None):
+        # As timeSeries, but generated in chunks of time steps (by default, the results source's chunk size)
+        if chunk is None:
+            return self.results.iterTimeSeries(variables, river, reach, rs, start, end)
+        return self.results.iterTimeSeries(variables, river, reach, rs, start, end, chunk)
     def allFlowDist(self, river = None, reach = None, rs = None, nprofs = 1):
         if nprofs == 1:
-            return self.ras.getLCRSimData(river, reach, rs)
+            return self.results.getLCRSimData(river, reach, rs)
         else:
-            return {i: self.ras.getLCRSimData(river, reach, rs, prof = i) for i in range(1, nprofs + 1)}
+            table = self.table(river, reach, rs, nprofs)
+            return {i: table.lcrSimData(river, reach, rs, prof = i) for i in range(1, nprofs + 1)}
     def allFlow(self, river = None, reach = None, rs = None, nprofs = 1):
         if nprofs == 1:
-            return self.ras.getSimData(river, reach, rs)
+            return self.results.getSimData(river, reach, rs)
         else:
-            return {i: self.ras.getSimData(river, reach, rs, prof = i) for i in range(1, nprofs + 1)}
+            table = self.table(river, reach, rs, nprofs)
+            return {i: table.simData(river, reach, rs, prof = i) for i in range(1, nprofs + 1)}
     def getSingleDatum(self, func, river, reach, rs, nprofs = 1):
         # Get a single datum (e.g. velocity, stage), regardless of level of nesting
         # func: function to extract relevant value from data class (e.g. lambda x: x.velocity)
@@ -95,26 +305,109 @@ class DataAPI(object):
         # func: function to extract relevant value from data class (e.g. lambda x: x.velocity)
         result = self.allFlowDist(river, reach, rs, nprofs)
         return nestedDictMap(result, func)
+    def getSingleArray(self, variable, func, river, reach, rs, nprofs = 1):
+        # Get a single variable as a view over the bulk result array, regardless of level of nesting
+        # func: function to extract relevant values from the (profile, xs, L/C/R) array (e.g. lambda a: a[..., 1])
+        result = self.results.getResultsArray([variable], range(1, nprofs + 1), river, reach, rs)
+        return result.nestProfiles(func(result[variable]), river, reach, rs)
     def velocity(self, river = None, reach = None, rs = None, nprofs = 1):
-        return self.getSingleDatum(lambda x: x.velocity, river, reach, rs, nprofs)
+        return self.getSingleArray("velocity", lambda a: a[..., 1], river, reach, rs, nprofs)
     def stage(self, river = None, reach = None, rs = None, nprofs = 1):
-        return self.getSingleDatum(lambda x: x.maxDepth, river, reach, rs, nprofs)
+        return self.getSingleArray("maxDepth", lambda a: a.max(axis=-1), river, reach, rs, nprofs)
     def shear(self, river = None, reach = None, rs = None, nprofs = 1):
-        return self.getSingleDatum(lambda x: x.shear, river, reach, rs, nprofs)
+        return self.getSingleArray("shear", lambda a: a[..., 1], river, reach, rs, nprofs)
     def velocityDist(self, river = None, reach = None, rs = None, nprofs = 1):
-        return self.getSingleDatumDist(lambda x: x.velocity, river, reach, rs, nprofs)
+        return self.getSingleArray("velocity", lambda a: a, river, reach, rs, nprofs)
     def depthDist(self, river = None, reach = None, rs = None, nprofs = 1):
-        return self.getSingleDatumDist(lambda x: x.maxDepth, river, reach, rs, nprofs)
+        return self.getSingleArray("maxDepth", lambda a: a, river, reach, rs, nprofs)
     def shearDist(self, river = None, reach = None, rs = None, nprofs = 1):
-        return self.getSingleDatumDist(lambda x: x.shear, river, reach, rs, nprofs)
+        return self.getSingleArray("shear", lambda a: a, river, reach, rs, nprofs)
+    def computeResults(self, variables = None, profiles = 1, river = None, reach = None, rs = None, steady = True,
+                       plan = None, timeout = None):
+        """
+        Run the model and read the given results, unless the same scenario has been run before: with a result store,
+        results are looked up by a hash of the geometry, applied Manning's n, flow, and plan (see ras/store.py)
+        before computing, and stored after reading.  On a hit HEC-RAS does not compute, so its own results (e.g. for
+        velocity or allFlow) are not updated; use the returned results.
+        :param variables, profiles, river, reach, rs: as for getResultsArray
+        :param steady, plan, timeout: as for OpsAPI.compute
+        :return: ResultArrays
+        :raises ComputeFailed: if HEC-RAS reports that the run failed; nothing is stored
+        """
+        if self.ops is None:
+            raise ValueError("computeResults needs the ops API; use it through API")
+        key = None
+        if self.store is not None:
+            profiles = [profiles] if isinstance(profiles, int) else list(profiles)
+            key = scenarioKey(self.ras, [variables, profiles, river, reach, rs, steady, plan])
+            results = self.store.get(key)
+            if results is not None:
+                return results
+        self.ops.compute(steady, plan, timeout = timeout)
+        if not computeSucceeded(self.ops.lastCompute.result):
+            raise ComputeFailed(self.ops.lastCompute.messages)
+        results = self.results.getResultsArray(variables, profiles, river, reach, rs)
+        if key is not None:
+            self.store.put(key, results)
+        return results
     # Below not strictly needed for raspy-cal
-    # def ratingCurve
+    def ratingCurve(self, river, reach, rs, flows, slope = 0.001, fileN = "01", hecVer = "5.0.7", flowRs = None,
+                    maxProfiles = MAX_PROFILES, timeout = None):
+        """
+        Compute a rating curve at a cross section by running all the flows as profiles of one steady flow file,
+        split into as few computes as the HEC-RAS profile limit allows, and reading the results in bulk.  This
+        replaces the current steady flow file (see ParamsAPI.setSteadyFlows).
+        :param river, reach, rs: the cross section
+        :param flows: list of flows
+        :param slope, fileN, hecVer: as for ParamsAPI.setSteadyFlows
+        :param flowRs: river station at which the flows are set; by default, the top of the reach
+        :param maxProfiles: maximum number of profiles per compute
+        :param timeout: as for OpsAPI.compute, per compute
+        :return: RatingCurve (see ras/results.py), sorted by flow
+        """
+        if self.ops is None or self.params is None:
+            raise ValueError("ratingCurve needs the ops and params APIs; use it through API")
+        flows = sorted(flows)
+        parts = []
+        for start in range(0, len(flows), maxProfiles):
+            chunk = flows[start:start + maxProfiles]
+            self.params.setSteadyFlows(river, reach, flowRs, chunk, slope, fileN, hecVer)
+            self.ops.compute(timeout = timeout)
+            parts.append(self.ras.getResultsArray(["maxDepth", "velocity", "shear"], range(1, len(chunk) + 1),
+                                                  river, reach, rs))
+        data = {v: np.concatenate([part[v][:, 0] for part in parts]) for v in ["maxDepth", "velocity", "shear"]}
+        return RatingCurve(river, reach, rs, flows, data["maxDepth"].max(axis=-1), data["velocity"][:, 1],
+                           data["shear"][:, 1])
     # def n
 
+def expandManning(manning, rch):
+    """
+    Expand a modifyN Manning's n specification into [(xs, (left, channel, right))] for the given reach.  A single n
+    for a cross section sets all three to that value.
+    """
+    lcr = lambda n: tuple(n[:3]) if n.__class__ == [].__class__ else (n, n, n)
+    if manning.__class__ == [].__class__ and len(manning) > 0:
+        # List of individual ns, or list of lists, one per cross section
+        xses = rch.xses
+        if len(manning) != len(xses):
+            raise ValueError("Got %d Manning's n values for %s %s, which has %d cross sections" %
+                             (len(manning), rch.river, rch.reach, len(xses)))
+        return [(xs, lcr(n)) for xs, n in zip(xses, manning)]
+    elif manning.__class__ == {}.__class__:
+        # Dictionary
+        return [(rch.xsAt(rs), lcr(manning[rs])) for rs in manning]
+    elif manning.__class__ == 0.1.__class__:
+        # Single value
+        return [(xs, lcr(manning)) for xs in rch.xses]
+    else:
+        raise (TypeError("Manning must be a list, dictionary or float"))
+
+@apiOperations("params")
 class ParamsAPI(object):
     # Setting parameters
     def __init__(self, rasObj):
         self.ras = rasObj
+        self.flowTemplates = {}
     # def newSteadyFlow
     # def newUnsteadyFlow
     # def modifySteadyFlow
@@ -131,75 +424,144 @@ class ParamsAPI(object):
         Note that Manning's equation seems to not be very sensitive to non-main channel n, in general.
 
         Note that for now the list functionality will instead take a list of 3 to set left, main channel, right ns.
+        A list must have one entry per cross section in the reach, or ValueError is raised.
         :param river: name of the river.
         :param reach: name of the reach
         :param geom: name (if string) or number (if integer) of the geometry file.  If None, it will use the currently active geometry, if any.
+        :return: {"written": <cross sections written>, "skipped": <cross sections skipped as unchanged>}.  Only cross
+            sections whose n differs from that last applied are written; inside a batch, "written" counts queued writes.
         """
-        if manning.__class__ == [].__class__ and len(manning) > 0:
-            # List
-            i = 0
-            for xs in self.ras.reach(river = river, reach = reach, geom = geom).xses:
-                if manning[i].__class__ == [].__class__:
-                    # List of lists
-                    xs.setAllManning(manning[i])
-                else:
-                    # List of individual ns
-                    xs.setMainChannelManning(manning[i])
-                i += 1
-        elif manning.__class__ == {}.__class__:
-            # Dictionary
-            rch = self.ras.reach(river = river, reach = reach, geom = geom)
-            for rs in manning:
-                xs = rch.xsAt(rs)
-                val = manning[rs]
-                if val.__class__ == [].__class__:
-                    xs.setAllManning(val)
-                else:
-                    xs.setMainChannelManning(val)
-        elif manning.__class__ == 0.1.__class__:
-            # Single value
-            for xs in self.ras.reach(river, reach, geom).xses:
-                xs.setMainChannelManning(manning)
+        counts = {"written": 0, "skipped": 0}
+        for xs, ns in expandManning(manning, self.ras.reach(river, reach, geom)):
+            counts["written" if xs.setMannLCR(ns[0], ns[1], ns[2]) else "skipped"] += 1
+        return counts
+
+    def modifyNFile(self, manning, river = None, reach = None, path = None, reload = True):
+        """
+        Specify Manning's n by editing the geometry file directly rather than through HEC-RAS, writing the file once
+        regardless of how many cross sections are changed.
+        :param manning: as for modifyN.  If river and reach are None, instead a dictionary of
+            {(river, reach): <manning as for modifyN>} to set several reaches at once.
+        :param river: name of the river
+        :param reach: name of the reach
+        :param path: geometry file to edit; if None, the currently active geometry file
+        :param reload: whether to reopen the project so that HEC-RAS uses the new geometry.  The project is not saved
+            first, as that would overwrite the edited file.
+        :return: {"written": <cross sections changed>, "skipped": <cross sections already at the given n>}.  If nothing
+            changed, the file is not written and the project is not reloaded.
+        """
+        if river is None and reach is None:
+            assignments = manning
         else:
-            raise (TypeError("Manning must be a list, dictionary or float"))
+            assignments = {(river, reach): manning}
+        path = self.ras.currentGeomFile() if path is None else path
+        geomFile = GeometryFile(path)
+        counts = {"written": 0, "skipped": 0}
+        for (riv, rch), mann in assignments.items():
+            for xs, ns in expandManning(mann, self.ras.reach(riv, rch)):
+                # Nodes other than cross sections (e.g. bridges) have no roughness block
+                if (xs.river, xs.reach, xs.rs) in geomFile.blocks:
+                    changed = geomFile.setMannLCR(xs.river, xs.reach, xs.rs, ns[0], ns[1], ns[2])
+                    counts["written" if changed else "skipped"] += 1
+        if not geomFile.changed():
+            return counts
+        geomFile.write()
+        if reload:
+            projPath = self.ras.currentProject()
+            self.ras.quit()
+            self.ras.openProject(projPath)
+        return counts
+
+    def batch(self):
+        """
+        Batch Manning's n writes, e.g.
+            with api.params.batch() as b:
+                api.params.modifyN(...)
+                api.params.modifyN(...)
+        All writes are made, and the project saved once, when the block ends.  Writes that would not change the last
+        known n of a cross section are skipped.  Afterwards, b.writes, b.skipped, and b.saves report what was done.
+        """
+        return self.ras.batch()
 
     def editSteadyFlows(self):
         self.ras.editSteadyFlow()
 
-    def setSteadyFlows(self, river, reach, rs, flows, slope = 0.001, fileN = "01", hecVer = "5.0.7"):
+    def setSteadyFlows(self, river, reach, rs, flows, slope = 0.001, fileN = "01", hecVer = "5.0.7", reload = "restart",
+                       skipIdentical = True):
         # Slope is used for boundary conditions - normal depth
-        # Bug: this doesn't take effect until Ras is closed and re-opened.
-        rs = self.ras.reach(river, reach).xses[0].rs if rs is None else rs
+        # Bug: HEC-RAS doesn't pick up the new file until Ras is closed and re-opened, which reload = "restart" does.
+        # reload = "plan" (experimental) re-selects the current plan instead, falling back to a restart if HEC-RAS's
+        # profile count doesn't match afterwards (see Ras.reloadFlow; timings are in self.ras.reloadStats).
+        # The file layout is built once per project/location/boundary configuration/profile count (FlowTemplate);
+        # later calls only fill in the flows.  If skipIdentical, a flow file that would not change is not rewritten
+        # or reloaded.  Returns whether the file was written.
+        projPath = self.ras.currentProject()
+        key = (projPath, river, reach, rs, slope, fileN, hecVer, len(flows))
+        if key not in self.flowTemplates:
+            self.flowTemplates[key] = FlowTemplate(self.ras, river, reach, rs, len(flows), slope, fileN, hecVer)
+        flowFile = self.flowTemplates[key].render(flows)
+        flowPath = "%s.f%s" % (os.path.splitext(projPath)[0], fileN)
+        if skipIdentical and self.ras.readFile(flowPath) == flowFile:
+            return False
+        self.ras.writeFile(flowPath, flowFile)
+        # Save and reload to make it use the new flow data
+        self.ras.save()
+        self.ras.reloadFlow(reload, len(flows))
+        return True
+
+
+def flowRows(flows):
+    """
+    Format flows as the data lines of a steady flow file: fields of 8 characters, 10 to a line.  pyrasfile's
+    mkFlowData drops the last flow when the count ends in 1 (and writes no lines for a single flow), so it isn't used.
+    """
+    fields = [("%5.1f" % q).rjust(8) for q in flows]
+    return ["".join(fields[k:k + 10]) for k in range(0, len(fields), 10)]
+
+
+class FlowTemplate(object):
+    """
+    A steady flow file with everything but the flows at the target location pre-rendered, as written by
+    ParamsAPI.setSteadyFlows.  The layout is that of pyrasfile's buildFile.
+    """
+    def __init__(self, ras, river, reach, rs, count, slope = 0.001, fileN = "01", hecVer = "5.0.7"):
+        # pyrasfile is only needed, and so only imported, when writing flow files
+        from pyrasfile import profileWriter as pw
+        rs = ras.reach(river, reach).xses[0].rs if rs is None else rs
         header = pw.mkFlowHeader(river, reach, rs)
-        otherHeaders = []
-        boundKeys = []
-        for riv in self.ras.rivers:
+        # Flow locations, (river, reach, header): the top of every reach, and the target
+        locations = OrderedDict()
+        for riv in ras.rivers:
             for rch in riv.reaches:
                 topXs = rch.xses[0]
-                otherHeaders.append(pw.mkFlowHeader(riv.river, rch.reach, topXs.rs))
-                boundKeys.append("%s,%s" % (riv.river, rch.reach))
-        count = len(flows)
-        pdata = {h: [1] * count for h in otherHeaders}  # Meaningless data so HEC-RAS doesn't complain
-        pdata[header] = flows
-        bound = lambda pn, q: pw.mkBoundaryData("Normal Depth", "Normal Depth", slope, slope)
-        bounds = {h: bound for h in boundKeys}
-        flowFile = pw.buildFile(count, pdata, bounds, title="Flow" + fileN, ver=hecVer)
-        projPath = self.ras.currentProject()
-        basePath = "\\".join(projPath.split("\\")[:-1])
-        projName = projPath.split("\\")[-1][:-4]  # without the .prj
-        flowPath = "%s\\%s.f%s" % (basePath, projName, fileN)
-        with open(flowPath, "w") as f:
-            f.write(flowFile)
-        # Save, quit, and reopen to make it use the new flow data
-        self.ras.save()
-        self.ras.quit()
-        self.ras.openProject(projPath)
+                locations[pw.mkFlowHeader(riv.river, rch.reach, topXs.rs)] = (riv.river, rch.reach)
+        locations[header] = (river, reach)
+        placeholder = flowRows([1] * count)  # Meaningless data so HEC-RAS doesn't complain
+        bound = pw.mkBoundaryData("Normal Depth", "Normal Depth", slope, slope)
+        lines = pw.mkHeader(count, "Flow" + fileN, hecVer).split("\n")
+        for h in locations:
+            lines.append(h)
+            if h == header:
+                # Target flows go on the lines right after the target header
+                start = len(lines)
+            lines += placeholder
+        for riv, rch in locations.values():
+            for pn in range(1, count + 1):
+                lines += [pw.mkBoundaryHeader(riv, rch, pn)] + bound
+        lines += pw.FILE_END.split("\n")
+        self.head = lines[:start]
+        self.tail = lines[start + len(placeholder):]
+        self.count = count
 
+    def render(self, flows):
+        if len(flows) != self.count:
+            raise ValueError("Number of flow profiles given does not match specified profile count!")
+        return "\n".join(self.head + flowRows(flows) + self.tail)
 
 
 class API(object):
-    def __init__(self, rasObj):
+    def __init__(self, rasObj, reader = None, store = None):
         self.ras = rasObj
         self.ops = OpsAPI(rasObj)
-        self.data = DataAPI(rasObj)
-        self.params = ParamsAPI(rasObj)
\ No newline at end of file
+        self.params = ParamsAPI(rasObj)
+        self.data = DataAPI(rasObj, reader, self.ops, self.params, store)
\ No newline at end of file
@@ -0,0 +1,156 @@
+"""
+Pipelined result extraction: one thread reads results from HEC-RAS while worker threads process them (unit
+conversion, objective functions, writing files, ...), so that processing overlaps with the time spent waiting on COM
+calls.  All COM calls are made on a single thread, as the HEC-RAS controller requires; reads and processing are
+connected by a bounded queue, so the reader waits (backpressure) when processing falls behind.
+
+    tasks = reachTasks(api.ras, profiles = range(1, 11))
+    pipe = Pipeline(lambda task, data: {rs: sd.velocity for rs, sd in data.items()}, workers = 2)
+    results = pipe.run(tasks, ras = api.ras)  # reads on this thread, which owns the controller
+
+or, with a dedicated COM thread that creates its own controller:
+
+    results = pipe.run(tasks, rasFactory = lambda: Ras(projectPath))
+"""
+
+import queue
+import threading
+import time
+
+
+def reachTasks(ras, profiles = 1):
+    """
+    Tasks reading each reach of the model for each profile.
+    :param profiles: profile number or list of profile numbers
+    :return: list of (river, reach, rs, prof) tasks, rs being None (all cross sections)
+    """
+    profiles = [profiles] if isinstance(profiles, int) else list(profiles)
+    return [(river, reach, None, prof) for river, reach in ras.reachKeys() for prof in profiles]
+
+
+def readLCR(ras, task):
+    # Default read: task is (river, reach, rs, prof) for getLCRSimData
+    river, reach, rs, prof = task
+    return ras.getLCRSimData(river, reach, rs, prof)
+
+
+class PipelineError(Exception):
+    pass
+
+
+class Pipeline(object):
+    """
+    Reads results for a list of tasks on one (COM-owning) thread and processes them on worker threads.  After run,
+    stats gives the seconds spent reading ("read") and processing ("process", summed over workers), the total
+    elapsed time ("elapsed"), and the number of times the reader had to wait for the queue ("waits").
+    """
+    def __init__(self, process, workers = 1, maxsize = 8, read = readLCR):
+        """
+        :param process: function process(task, data), run on a worker thread for each task; its return values are
+            the results of run
+        :param workers: number of processing threads
+        :param maxsize: maximum number of read results waiting to be processed
+        :param read: function read(ras, task) returning the data for a task, run on the COM thread; by default,
+            task is (river, reach, rs, prof) and data is from getLCRSimData
+        """
+        self.process = process
+        self.workers = workers
+        self.maxsize = maxsize
+        self.read = read
+        self.stats = {}
+
+    def run(self, tasks, ras = None, rasFactory = None):
+        """
+        Read and process all the tasks.
+        :param tasks: list of tasks, as accepted by read
+        :param ras: Ras to read from on the calling thread, which must be the thread that created its controller
+        :param rasFactory: alternatively, a function returning a Ras, called on a new dedicated COM thread (which
+            initializes COM itself); the Ras is quit when done
+        :return: list of the results of process, in task order
+        """
+        if (ras is None) == (rasFactory is None):
+            raise ValueError("Exactly one of ras and rasFactory must be given")
+        tasks = list(tasks)
+        self.queue = queue.Queue(self.maxsize)
+        self.results = [None] * len(tasks)
+        self.errors = []
+        self.lock = threading.Lock()
+        self.stats = {"read": 0.0, "process": 0.0, "elapsed": 0.0, "waits": 0}
+        start = time.perf_counter()
+        threads = [threading.Thread(target = self.consume, name = "raspy-process-%d" % k, daemon = True)
+                   for k in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        if ras is not None:
+            self.produce(ras, tasks)
+        else:
+            reader = threading.Thread(target = self.produceCOM, args = (rasFactory, tasks), name = "raspy-com",
+                                      daemon = True)
+            reader.start()
+            reader.join()
+        for thread in threads:
+            thread.join()
+        self.stats["elapsed"] = time.perf_counter() - start
+        if len(self.errors) > 0:
+            task, error = self.errors[0]
+            raise PipelineError("Task %r failed: %r" % (task, error)) from error
+        return self.results
+
+    def produceCOM(self, rasFactory, tasks):
+        # Dedicated COM thread: initialize COM for this thread (where pywin32 is available), create the Ras, read
+        try:
+            import pythoncom
+        except ImportError:
+            pythoncom = None
+        if pythoncom is not None:
+            pythoncom.CoInitialize()
+        try:
+            try:
+                ras = rasFactory()
+            except Exception as e:
+                self.errors.append((None, e))
+                self.finish()
+                return
+            try:
+                self.produce(ras, tasks)
+            finally:
+                ras.quit()
+        finally:
+            if pythoncom is not None:
+                pythoncom.CoUninitialize()
+
+    def produce(self, ras, tasks):
+        try:
+            for i, task in enumerate(tasks):
+                if len(self.errors) > 0:
+                    break
+                start = time.perf_counter()
+                try:
+                    data = self.read(ras, task)
+                except Exception as e:
+                    self.errors.append((task, e))
+                    break
+                self.stats["read"] += time.perf_counter() - start
+                if self.queue.full():
+                    self.stats["waits"] += 1
+                self.queue.put((i, task, data))
+        finally:
+            self.finish()
+
+    def finish(self):
+        # One sentinel per worker
+        for k in range(self.workers):
+            self.queue.put(None)
+
+    def consume(self):
+        for item in iter(self.queue.get, None):
+            i, task, data = item
+            if len(self.errors) > 0:
+                continue  # drain without processing, so the reader is not blocked
+            start = time.perf_counter()
+            try:
+                self.results[i] = self.process(task, data)
+            except Exception as e:
+                self.errors.append((task, e))
+            with self.lock:
+                self.stats["process"] += time.perf_counter() - start
@@ -0,0 +1,198 @@
+"""
+Running many scenarios (Manning's n sets, steady flows) in parallel, each worker process driving its own HEC-RAS
+controller on its own copy of the project directory.
+"""
+
+import multiprocessing
+import os
+import queue
+import shutil
+import tempfile
+import time
+from collections import deque
+
+from raspy_auto.ras.ras import Ras
+from raspy_auto.api.api import API
+
+
+class Scenario(object):
+    """
+    A scenario to run.
+    name: identifies the scenario in the results
+    manning: optional {(river, reach): manning}, with manning as for ParamsAPI.modifyN
+    flows: optional keyword arguments for ParamsAPI.setSteadyFlows (river, reach, rs, flows, ...)
+    variables: result variables to retrieve (see Ras.getResultsArray); None for all
+    nprofs: number of profiles to retrieve; by default, the number of flows, or 1
+    steady: whether to run steady or unsteady flow
+    """
+    def __init__(self, name, manning = None, flows = None, variables = None, nprofs = None, steady = True):
+        self.name = name
+        self.manning = manning
+        self.flows = flows
+        self.variables = variables
+        if nprofs is None:
+            nprofs = len(flows["flows"]) if flows is not None else 1
+        self.nprofs = nprofs
+        self.steady = steady
+
+    def run(self, api):
+        """
+        Apply the scenario, compute, and return the results (ResultArrays).
+        """
+        if self.manning is not None:
+            with api.params.batch():
+                for (river, reach), manning in self.manning.items():
+                    api.params.modifyN(manning, river, reach)
+        if self.flows is not None:
+            api.params.setSteadyFlows(**self.flows)
+        api.ops.compute(steady = self.steady)
+        return api.ras.getResultsArray(self.variables, range(1, self.nprofs + 1))
+
+
+class ScenarioResult(object):
+    """
+    The outcome of a scenario: its name, results (None if it failed), error message (None if it succeeded), the
+    index of the worker that ran it, and the time taken in seconds.
+    """
+    def __init__(self, name, result, error, worker, elapsed):
+        self.name = name
+        self.result = result
+        self.error = error
+        self.worker = worker
+        self.elapsed = elapsed
+
+
+def runWorker(worker, projectPath, which, rasObject, tasks, results):
+    # Worker process: open the project copy, then run scenarios until the None sentinel
+    ras = Ras(projectPath, which, rasObject() if rasObject is not None else None)
+    api = API(ras)
+    try:
+        for scenario in iter(tasks.get, None):
+            start = time.monotonic()
+            try:
+                result = scenario.run(api)
+                error = None
+            except Exception as e:
+                result = None
+                error = repr(e)
+            results.put(ScenarioResult(scenario.name, result, error, worker, time.monotonic() - start))
+    finally:
+        ras.quit()
+
+
+class ScenarioPool(object):
+    """
+    A pool of worker processes, each with its own controller and its own copy of the project directory.
+
+    with ScenarioPool(projectPath, workers=4) as pool:
+        for res in pool.run(scenarios):
+            ...  # results arrive as they finish, in no particular order
+
+    Each worker is given one scenario at a time, so that if a worker process dies (e.g. HEC-RAS crashes it), the
+    scenario it was running is known: it is reported as a failed ScenarioResult and the worker is restarted.
+    """
+    def __init__(self, projectPath, workers = 2, which = "507", rasObject = None, workDir = None,
+                 keepCopies = False):
+        """
+        :param projectPath: path to the project (.prj) file.  Its whole directory is copied for each worker.
+        :param workers: number of worker processes (and HEC-RAS instances)
+        :param which: HEC-RAS version, as for Ras
+        :param rasObject: optional factory (a picklable callable, e.g. a module-level function or class) returning
+            the RasObject for each worker, as Ras's rasObject argument.  If None, each worker starts a new controller.
+        :param workDir: directory for the project copies; by default, a new temporary directory
+        :param keepCopies: whether to keep the project copies after closing
+        """
+        self.projectPath = projectPath
+        self.workers = workers
+        self.which = which
+        self.rasObject = rasObject
+        self.ownWorkDir = workDir is None
+        self.workDir = tempfile.mkdtemp(prefix = "raspy") if workDir is None else workDir
+        self.keepCopies = keepCopies
+        self.processes = []
+        self.copies = []
+        self.paths = []
+        self.taskQueues = []
+
+    def cloneProject(self, worker):
+        projectDir, projectFile = os.path.split(os.path.abspath(self.projectPath))
+        dest = os.path.join(self.workDir, "worker%d" % worker)
+        if os.path.exists(dest):
+            shutil.rmtree(dest)
+        shutil.copytree(projectDir, dest)
+        self.copies.append(dest)
+        return os.path.join(dest, projectFile)
+
+    def start(self):
+        self.results = multiprocessing.Queue()
+        for worker in range(self.workers):
+            self.paths.append(self.cloneProject(worker))
+            self.taskQueues.append(multiprocessing.Queue())
+            self.processes.append(None)
+            self.startWorker(worker)
+        return self
+
+    def startWorker(self, worker):
+        # (Re)start the process of the given worker, on its project copy
+        args = (worker, self.paths[worker], self.which, self.rasObject, self.taskQueues[worker], self.results)
+        proc = multiprocessing.Process(target = runWorker, args = args)
+        proc.daemon = True
+        proc.start()
+        self.processes[worker] = proc
+
+    def run(self, scenarios):
+        """
+        Run the scenarios, yielding a ScenarioResult for each as it finishes.  A scenario whose worker process dies
+        while running it yields a ScenarioResult with an error, and the worker is restarted for the rest.
+        """
+        if len(self.processes) == 0:
+            self.start()
+        pending = deque(scenarios)
+        # Scenario and start time by worker, for the workers running one
+        running = {}
+        while len(pending) > 0 or len(running) > 0:
+            for worker in range(self.workers):
+                if worker not in running and len(pending) > 0:
+                    scenario = pending.popleft()
+                    running[worker] = (scenario, time.monotonic())
+                    self.taskQueues[worker].put(scenario)
+            try:
+                result = self.results.get(timeout = 1)
+            except queue.Empty:
+                # Results sent before a worker died have arrived by now, so its scenario is lost
+                for worker, (scenario, start) in list(running.items()):
+                    exitcode = self.processes[worker].exitcode
+                    if exitcode is not None:
+                        del running[worker]
+                        # A new queue, in case the worker died before taking its scenario
+                        self.taskQueues[worker] = multiprocessing.Queue()
+                        self.startWorker(worker)
+                        yield ScenarioResult(scenario.name, None, "Worker %d exited (exit code %d) while running "
+                                             "the scenario" % (worker, exitcode), worker, time.monotonic() - start)
+                continue
+            running.pop(result.worker, None)
+            yield result
+
+    def close(self):
+        """
+        Stop the workers (quitting their controllers) and remove the project copies unless keepCopies is set.
+        """
+        for tasks in self.taskQueues:
+            tasks.put(None)
+        for proc in self.processes:
+            proc.join()
+        self.processes = []
+        self.taskQueues = []
+        self.paths = []
+        if not self.keepCopies:
+            for copy in self.copies:
+                shutil.rmtree(copy, ignore_errors = True)
+            self.copies = []
+            if self.ownWorkDir:
+                shutil.rmtree(self.workDir, ignore_errors = True)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.close()
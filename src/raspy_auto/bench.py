@@ -0,0 +1,144 @@
+"""
+Benchmarks of raspy operations against the fake controller (ras.fake), reporting wall time and the number of COM
+calls each operation makes.  COM call counts are deterministic, so they catch regressions in call volume even where
+timings are noisy.  Run with, e.g.:
+
+    python -m raspy_auto.bench --rivers 2 --reaches 3 --xs 100 --profiles 10 --latency 0.0001
+
+Use --json for machine-readable output, and --max-calls NAME=COUNT to fail (exit status 1) if an operation exceeds
+a COM call budget.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from raspy_auto.ras.fake import FakeController
+from raspy_auto.ras.ras import Ras
+from raspy_auto.ras.wrapper import RasObject
+from raspy_auto.api.api import API
+from raspy_auto.api.pipeline import Pipeline, reachTasks, readLCR
+
+
+class BenchResult(object):
+    """
+    The outcome of one benchmark: name, wall time (seconds), and COM calls by method.
+    """
+    def __init__(self, name, seconds, calls):
+        self.name = name
+        self.seconds = seconds
+        self.calls = calls
+
+    def totalCalls(self):
+        return sum(self.calls.values())
+
+    def toDict(self):
+        return {"name": self.name, "seconds": self.seconds, "calls": self.totalCalls(), "byMethod": self.calls}
+
+
+def measure(name, controller, func):
+    controller.calls.clear()
+    start = time.perf_counter()
+    func()
+    return BenchResult(name, time.perf_counter() - start, dict(controller.calls))
+
+
+def makeProject(directory):
+    # Minimal project files: the fake controller serves everything else
+    projectPath = os.path.join(directory, "bench.prj")
+    with open(projectPath, "w") as f:
+        f.write("Proj Title=bench\nCurrent Plan=p01\n")
+    with open(os.path.join(directory, "bench.p01"), "w") as f:
+        f.write("Plan Title=Bench\nGeom File=g01\nFlow File=f01\n")
+    return projectPath
+
+
+def runBenchmarks(rivers = 1, reaches = 1, xs = 50, profiles = 5, latency = 0.0):
+    """
+    Run the benchmark suite on a synthetic model of the given size.
+    :return: list of BenchResult
+    """
+    directory = tempfile.mkdtemp(prefix = "raspybench")
+    try:
+        projectPath = makeProject(directory)
+        controller = FakeController(rivers, reaches, xs, profiles, latency)
+        results = []
+        holder = {}
+        results.append(measure("Ras()", controller, lambda: holder.setdefault(
+            "ras", Ras(projectPath, rasObject = RasObject(ras = controller), geomCache = False))))
+        api = API(holder["ras"])
+        river = api.ras.rivers[0].river
+        reach = api.ras.rivers[0].reaches[0].reach
+        rs = api.ras.rivers[0].reaches[0].xses[0].rs
+
+        def batchN():
+            with api.params.batch():
+                api.params.modifyN(0.045, river, reach)
+        results.append(measure("modifyN", controller, lambda: api.params.modifyN(0.04, river, reach)))
+        results.append(measure("modifyN (batch)", controller, batchN))
+        results.append(measure("modifyN (unchanged)", controller, lambda: api.params.modifyN(0.045, river, reach)))
+        flows = [100.0 * (i + 1) for i in range(profiles)]
+        results.append(measure("setSteadyFlows", controller,
+                               lambda: api.params.setSteadyFlows(river, reach, rs, flows)))
+        results.append(measure("compute", controller, lambda: api.ops.compute()))
+        # Result reads are measured cold, i.e. without memoized results, except where noted
+        cold = lambda func: lambda: (api.ras.invalidateResults(), func())
+        for name in ["velocity", "stage", "shear", "velocityDist"]:
+            func = getattr(api.data, name)
+            results.append(measure("data.%s" % name, controller, cold(lambda: func(nprofs = profiles))))
+        results.append(measure("data.allFlowDist", controller, cold(lambda: api.data.allFlowDist(nprofs = profiles))))
+        results.append(measure("getResultsArray", controller,
+                               cold(lambda: api.ras.getResultsArray(None, range(1, profiles + 1)))))
+        # Result reads overlapped with processing (here, a unit conversion) on worker threads, against the same reads
+        # and processing done serially
+        tasks = reachTasks(api.ras, range(1, profiles + 1))
+        convert = lambda task, data: {rs: [0.3048 * v for v in sd.velocity] for rs, sd in data.items()}
+        results.append(measure("getLCRSimData (serial)", controller, cold(
+            lambda: [convert(task, readLCR(api.ras, task)) for task in tasks])))
+        results.append(measure("getLCRSimData (pipeline)", controller, cold(
+            lambda: Pipeline(convert, workers = 2).run(tasks, ras = api.ras))))
+        results.append(measure("data.shear (memoized)", controller, lambda: api.data.shear(nprofs = profiles)))
+        # Replaces the flow file, so runs last
+        results.append(measure("data.ratingCurve", controller, lambda: api.data.ratingCurve(
+            river, reach, rs, [50.0 * (i + 1) for i in range(25)])))
+        return results
+    finally:
+        shutil.rmtree(directory, ignore_errors = True)
+
+
+def formatTable(results):
+    lines = ["%-26s %10s %10s" % ("operation", "seconds", "COM calls")]
+    for res in results:
+        lines.append("%-26s %10.4f %10d" % (res.name, res.seconds, res.totalCalls()))
+    return "\n".join(lines)
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Benchmark raspy operations against a fake HEC-RAS controller")
+    parser.add_argument("--rivers", type = int, default = 1)
+    parser.add_argument("--reaches", type = int, default = 1)
+    parser.add_argument("--xs", type = int, default = 50)
+    parser.add_argument("--profiles", type = int, default = 5)
+    parser.add_argument("--latency", type = float, default = 0.0, help = "simulated seconds per COM call")
+    parser.add_argument("--json", action = "store_true", help = "print results as JSON")
+    parser.add_argument("--max-calls", action = "append", default = [], metavar = "NAME=COUNT",
+                        help = "fail if the named operation makes more than COUNT COM calls")
+    args = parser.parse_args(argv)
+    results = runBenchmarks(args.rivers, args.reaches, args.xs, args.profiles, args.latency)
+    if args.json:
+        print(json.dumps([res.toDict() for res in results], indent = 2))
+    else:
+        print(formatTable(results))
+    budgets = dict(item.rsplit("=", 1) for item in args.max_calls)
+    failed = [res.name for res in results if res.name in budgets and res.totalCalls() > int(budgets[res.name])]
+    for name in failed:
+        print("%s exceeded its COM call budget of %s" % (name, budgets[name]), file = sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,49 @@
+"""
+Deferred imports for package namespaces, so that importing raspy_auto (or a subpackage) does not import numpy,
+h5py, the COM libraries, etc. until a name that needs them is used.
+"""
+
+import importlib
+import importlib.util
+import sys
+
+
+def lazyExports(namespace, exports, fallback = None):
+    """
+    Make the given names available from a package's namespace, importing each on first access (through a module
+    __getattr__).  Before Python 3.7, which lacks module __getattr__, they are all imported immediately.
+    :param namespace: the package's globals()
+    :param exports: {name: (module, attribute)}; attribute None means the name is the module itself
+    :param fallback: optional module whose attributes are also available from the package, for names not in exports
+    """
+    def load(name):
+        if name in exports:
+            module, attribute = exports[name]
+        elif name.startswith("__"):
+            raise AttributeError("module %r has no attribute %r" % (namespace["__name__"], name))
+        elif importlib.util.find_spec("%s.%s" % (namespace["__name__"], name)) is not None:
+            # A submodule, e.g. for "from raspy_auto.ras import fake"
+            module, attribute = "%s.%s" % (namespace["__name__"], name), None
+        elif fallback is not None:
+            module, attribute = fallback, name
+        else:
+            raise AttributeError("module %r has no attribute %r" % (namespace["__name__"], name))
+        value = importlib.import_module(module)
+        if attribute is not None:
+            try:
+                value = getattr(value, attribute)
+            except AttributeError:
+                raise AttributeError("module %r has no attribute %r" % (namespace["__name__"], name))
+        namespace[name] = value
+        return value
+
+    if sys.version_info < (3, 7):
+        for name in exports:
+            load(name)
+        if fallback is not None:
+            module = importlib.import_module(fallback)
+            for name, value in vars(module).items():
+                if not name.startswith("__"):
+                    namespace.setdefault(name, value)
+    else:
+        namespace["__getattr__"] = load
@@ -1,2 +1,12 @@
-from raspy_auto.ras.ras import Ras
-from raspy_auto.ras.wrapper import RasObject
\ No newline at end of file
+from raspy_auto.lazy import lazyExports
+
+lazyExports(globals(), {
+    "Ras": ("raspy_auto.ras.ras", "Ras"),
+    "RasObject": ("raspy_auto.ras.wrapper", "RasObject"),
+    "ResultReader": ("raspy_auto.ras.hdf", "ResultReader"),
+    "readBatch": ("raspy_auto.ras.hdf", "readBatch"),
+    "ControllerPool": ("raspy_auto.ras.pool", "ControllerPool"),
+    "ResultStore": ("raspy_auto.ras.store", "ResultStore"),
+    "RecordingController": ("raspy_auto.ras.trace", "RecordingController"),
+    "ReplayController": ("raspy_auto.ras.trace", "ReplayController")
+}, fallback = "raspy_auto.ras.ras")
@@ -0,0 +1,215 @@
+"""
+An in-memory stand-in for the HEC-RAS controller, implementing the COM methods used by wrapper.RasObject.  It serves
+a synthetic model of configurable size, with optional simulated latency per call, and counts calls by method.  This
+allows raspy to be run, tested, and benchmarked without HEC-RAS (or Windows):
+
+    controller = FakeController(rivers=2, reaches=3, xs=100, profiles=10, latency=0.001)
+    ras = Ras(projectPath, rasObject=RasObject(ras=controller))
+
+Results are computed from a wide-channel Manning's equation, so they respond to roughness and flow changes.
+"""
+
+import functools
+import math
+import time
+from collections import Counter
+
+WIDTH = 50.0  # main channel width
+SLOPE = 0.001
+UNIT_WEIGHT = 62.4
+# Output_NodeOutput variable numbers served, with their HEC-RAS names
+VARIABLE_NAMES = {2: "W.S. Elev", 4: "Max Chl Dpth", 5: "Min Ch El", 9: "Q Total", 23: "Vel Chnl",
+                  151: "Shear LOB", 152: "Shear Chan", 153: "Shear ROB"}
+
+
+def comMethod(func):
+    # Count the call and apply the simulated latency
+    @functools.wraps(func)
+    def wrapped(self, *args):
+        self.calls[func.__name__] += 1
+        if self.latency > 0:
+            time.sleep(self.latency)
+        return func(self, *args)
+    return wrapped
+
+
+class FakeController(object):
+    """
+    Synthetic HEC-RAS controller.  calls is a Counter of COM calls by method name.
+    """
+    def __init__(self, rivers = 1, reaches = 1, xs = 10, profiles = 1, latency = 0.0, computeTime = 0.0,
+                 projectPath = None, planReloadsFlows = True):
+        """
+        :param rivers, reaches, xs: model size (reaches per river, cross sections per reach)
+        :param profiles: number of steady flow profiles
+        :param latency: simulated time per COM call, in seconds
+        :param computeTime: simulated compute run time, in seconds.  As in HEC-RAS, Compute_CurrentPlan waits for the
+            run to finish unless called with BlockingMode False.
+        :param projectPath: initially open project
+        :param planReloadsFlows: whether re-selecting a plan re-reads the flow file; if False, flow data is only read
+            when the project is opened, to check code that relies on plan reloads
+        """
+        self.calls = Counter()
+        self.latency = latency
+        self.computeTime = computeTime
+        self.computeStart = None
+        self.project = projectPath
+        self.planReloadsFlows = planReloadsFlows
+        self.model = [("River %d" % a, [("Reach %d" % b, [str((xs - c) * 100) for c in range(xs)])
+                                        for b in range(1, reaches + 1)])
+                      for a in range(1, rivers + 1)]
+        self.flows = [100.0 * p for p in range(1, profiles + 1)]
+        self.manning = {}
+
+    def loadFlows(self):
+        """
+        Read flows from the project's steady flow file (.f01), if there is one, as HEC-RAS would on opening the
+        project.  Each profile's flow is the largest given at any location.
+        """
+        try:
+            with open(self.project[:-4] + ".f01") as f:
+                lines = f.read().split("\n")
+        except (OSError, TypeError):
+            return
+        count = int([line for line in lines if line.startswith("Number of Profiles=")][0].split("=")[1])
+        flows = [0.0] * count
+        for i, line in enumerate(lines):
+            if line.startswith("River Rch & RM="):
+                values = []
+                for data in lines[i + 1:]:
+                    if len(values) >= count or "=" in data:
+                        break
+                    values += [float(data[k:k + 8]) for k in range(0, len(data), 8)]
+                flows = [max(q, v) for q, v in zip(flows, values + [0.0] * count)]
+        self.flows = flows
+
+    def node(self, riv, rch, n):
+        river, reaches = self.model[riv - 1]
+        reach, stations = reaches[rch - 1]
+        return river, reach, stations[n - 1]
+
+    def hydraulics(self, riv, rch, n, prof):
+        """
+        :return: (flow, depth, velocity, shear) for the main channel, and n by (left, channel, right)
+        """
+        ns = self.manning.get(self.node(riv, rch, n), (0.06, 0.035, 0.06))
+        flow = self.flows[(prof - 1) % len(self.flows)] * (1 + 0.01 * n)
+        depth = (flow * ns[1] / (1.49 * WIDTH * math.sqrt(SLOPE))) ** 0.6
+        return flow, depth, flow / (WIDTH * depth), UNIT_WEIGHT * depth * SLOPE, ns
+
+    @comMethod
+    def ShowRas(self):
+        pass
+
+    @comMethod
+    def QuitRas(self):
+        self.project = None
+
+    @comMethod
+    def Project_Open(self, path):
+        self.project = path
+        self.loadFlows()
+
+    @comMethod
+    def Project_Current(self):
+        return self.project
+
+    @comMethod
+    def Project_Save(self):
+        pass
+
+    @comMethod
+    def CurrentGeomFile(self):
+        return self.project[:-4] + ".g01"
+
+    @comMethod
+    def CurrentPlanFile(self):
+        return self.project[:-4] + ".p01"
+
+    @comMethod
+    def Plan_SetCurrent(self, plan):
+        if self.planReloadsFlows:
+            self.loadFlows()
+        return True
+
+    @property
+    def SteadyFlow_nProfile(self):
+        return len(self.flows)
+
+    @comMethod
+    def Geometry_GetRivers(self):
+        return (len(self.model), tuple(river.ljust(16) for river, reaches in self.model))
+
+    @comMethod
+    def Geometry_GetReaches(self, riv):
+        reaches = self.model[riv - 1][1]
+        return (riv, len(reaches), tuple(reach.ljust(16) for reach, stations in reaches))
+
+    @comMethod
+    def Geometry_GetNodes(self, riv, rch):
+        stations = self.model[riv - 1][1][rch - 1][1]
+        return (riv, rch, len(stations), tuple(rs.ljust(8) for rs in stations), ("",) * len(stations))
+
+    @comMethod
+    def Geometry_SetMann_LChR(self, river, reach, rs, left, channel, right):
+        self.manning[(river, reach, rs)] = (left, channel, right)
+        return (river, reach, rs, left, channel, right, "")
+
+    @comMethod
+    def Geometry_SetMann(self, river, reach, rs, nMann, manns):
+        ns = list(manns)
+        self.manning[(river, reach, rs)] = (ns[0], ns[len(ns) // 2], ns[-1])
+        return (river, reach, rs, nMann, manns, "")
+
+    @comMethod
+    def Output_Variables(self):
+        count = max(VARIABLE_NAMES)
+        names = tuple(VARIABLE_NAMES.get(i, "") for i in range(1, count + 1))
+        return (count, names, names)
+
+    @comMethod
+    def Output_GetProfiles(self):
+        return (len(self.flows), tuple("PF %d" % p for p in range(1, len(self.flows) + 1)))
+
+    @comMethod
+    def Output_NodeOutput(self, riv, rch, n, updn, prof, nVar):
+        flow, depth, velocity, shear, ns = self.hydraulics(riv, rch, n, prof)
+        invert = 100.0 - 0.1 * n
+        values = {2: invert + depth, 4: depth, 5: invert, 9: flow, 23: velocity,
+                  151: 0.1 * shear, 152: shear, 153: 0.1 * shear}
+        return (values.get(nVar, 0.0), riv, rch, n, updn, prof, nVar)
+
+    @comMethod
+    def Output_VelDist(self, riv, rch, n, updn, prof):
+        flow, depth, velocity, shear, ns = self.hydraulics(riv, rch, n, prof)
+        obDepth = 0.2 * depth
+        obVelocity = (1.49 / ns[0]) * obDepth ** (2.0 / 3) * math.sqrt(SLOPE)
+        obArea = 10 * obDepth
+        area = (obArea, WIDTH * depth, obArea)
+        flows = (obArea * obVelocity, flow, obArea * obVelocity)
+        return (riv, rch, n, updn, prof, 3, (0.0, 10.0, 10.0 + WIDTH), (10.0, 10.0 + WIDTH, 20.0 + WIDTH),
+                tuple(100 * q / sum(flows) for q in flows), area, (10.0, WIDTH + 2 * depth, 10.0), flows,
+                (obDepth, depth, obDepth), (obVelocity, velocity, obVelocity))
+
+    @comMethod
+    def Compute_CurrentPlan(self, nmsg = None, msgs = None, blocking = True):
+        self.computeStart = time.monotonic()
+        if blocking:
+            time.sleep(self.computeTime)
+        return (True, 1, ("Computations completed",), blocking)
+
+    @comMethod
+    def Compute_Complete(self):
+        return self.computeStart is not None and time.monotonic() - self.computeStart >= self.computeTime
+
+    @comMethod
+    def Compute_Cancel(self):
+        self.computeStart = None
+
+    @comMethod
+    def Edit_SteadyFlowData(self):
+        pass
+
+    @comMethod
+    def SteadyFlow_SetFlow(self, river, reach, rs, flows):
+        self.flows = [float(q) for q in flows[1:]]
@@ -0,0 +1,153 @@
+"""
+Direct editing of Manning's n in HEC-RAS geometry files (.gXX), as an alternative to setting it one cross section at
+a time through the controller.  The file is parsed once, all #Mann= blocks are indexed by (river, reach, rs), and
+all changes are written back in a single pass.  This works on any platform, as it does not use HEC-RAS.
+
+Relevant geometry file format:
+
+River Reach=RiverOne        ,Lower
+Type RM Length L Ch R = 1 ,2000    ,100,100,100
+...
+#Mann= 3 , 0 , 0
+       0     .06       0      50    .035       0     150     .06       0
+Bank Sta=50,150
+
+Type 1 is a cross section.  #Mann= gives the number of roughness entries, each of which is (station, n, 0), in
+fields 8 characters wide, 9 fields (3 entries) per line.
+"""
+
+FIELD_WIDTH = 8
+FIELDS_PER_LINE = 9
+
+
+def fieldsOf(line):
+    line = line.rstrip("\r\n")
+    return [line[i:i + FIELD_WIDTH] for i in range(0, len(line), FIELD_WIDTH)]
+
+
+def formatN(n):
+    # HEC-RAS style: no leading zero, fitting in one field
+    text = ("%.6g" % n)
+    if text.startswith("0."):
+        text = text[1:]
+    return text[:FIELD_WIDTH].rjust(FIELD_WIDTH)
+
+
+class MannBlock(object):
+    """
+    The #Mann= block of one cross section.
+    start: line number of the first data line
+    nlines: number of data lines
+    fields: the raw data fields (strings), kept so that unchanged values are written back exactly
+    banks: (left, right) bank stations, if known
+    """
+    def __init__(self, start, nlines, fields):
+        self.start = start
+        self.nlines = nlines
+        self.fields = fields
+        self.banks = None
+        self.changed = False
+
+    def entries(self):
+        return [(float(self.fields[i]), float(self.fields[i + 1])) for i in range(0, len(self.fields) - 2, 3)]
+
+    def setLCR(self, left, channel, right):
+        """
+        Set the left overbank, main channel, and right overbank n.  Entries are assigned to a region by their
+        station relative to the bank stations; without bank stations, a 3-entry block is set in order.
+        :return: whether any n changed
+        """
+        entries = self.entries()
+        if self.banks is None:
+            if len(entries) != 3:
+                raise ValueError("Cannot set left/channel/right n without bank stations")
+            regions = [0, 1, 2]
+        else:
+            regions = [0 if sta < self.banks[0] else 1 if sta < self.banks[1] else 2 for sta, n in entries]
+        ns = (left, channel, right)
+        changed = False
+        for k, region in enumerate(regions):
+            value = formatN(ns[region])
+            if float(value) != float(self.fields[3 * k + 1]):
+                self.fields[3 * k + 1] = value
+                changed = True
+        self.changed = self.changed or changed
+        return changed
+
+    def lines(self, newline):
+        return ["".join(self.fields[i:i + FIELDS_PER_LINE]) + newline
+                for i in range(0, len(self.fields), FIELDS_PER_LINE)]
+
+
+class GeometryFile(object):
+    """
+    A HEC-RAS geometry file, indexed for roughness editing.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, newline="") as f:
+            self.lines = f.readlines()
+        self.blocks = {}
+        self.parse()
+
+    def parse(self):
+        river = reach = node = None
+        i = 0
+        while i < len(self.lines):
+            line = self.lines[i]
+            if line.startswith("River Reach="):
+                river, reach = [s.strip() for s in line.split("=", 1)[1].split(",")[:2]]
+                node = None
+            elif line.startswith("Type RM Length L Ch R"):
+                fields = [s.strip() for s in line.split("=", 1)[1].split(",")]
+                node = (river, reach, fields[1]) if fields[0] == "1" else None
+            elif line.startswith("#Mann=") and node is not None:
+                count = int(line.split("=", 1)[1].split(",")[0])
+                nfields = 3 * count
+                nlines = -(-nfields // FIELDS_PER_LINE)
+                fields = []
+                for data in self.lines[i + 1:i + 1 + nlines]:
+                    fields += fieldsOf(data)
+                self.blocks[node] = MannBlock(i + 1, nlines, fields[:nfields])
+                i += nlines
+            elif line.startswith("Bank Sta=") and node in self.blocks:
+                self.blocks[node].banks = tuple(float(s) for s in line.split("=", 1)[1].split(",")[:2])
+            i += 1
+
+    def crossSections(self, river = None, reach = None):
+        return [key for key in self.blocks
+                if (river is None or key[0] == river) and (reach is None or key[1] == reach)]
+
+    def getMann(self, river, reach, rs):
+        """
+        :return: list of (station, n) roughness entries for the cross section
+        """
+        return self.blocks[(river, reach, rs)].entries()
+
+    def setMannLCR(self, river, reach, rs, left, channel, right):
+        return self.blocks[(river, reach, rs)].setLCR(left, channel, right)
+
+    def changed(self):
+        return any(block.changed for block in self.blocks.values())
+
+    def render(self):
+        starts = {block.start: block for block in self.blocks.values() if block.changed}
+        out = []
+        i = 0
+        while i < len(self.lines):
+            if i in starts:
+                block = starts[i]
+                last = self.lines[i + block.nlines - 1]
+                out += block.lines("\r\n" if last.endswith("\r\n") else "\n")
+                i += block.nlines
+            else:
+                out.append(self.lines[i])
+                i += 1
+        return "".join(out)
+
+    def write(self, path = None):
+        """
+        Write the file (by default, back to where it was read from) in one pass.
+        """
+        with open(self.path if path is None else path, "w", newline="") as f:
+            f.write(self.render())
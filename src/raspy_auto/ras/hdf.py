@@ -0,0 +1,307 @@
+"""
+Direct reading of HEC-RAS plan output files (.pXX.hdf, written by HEC-RAS 5.x/6.x), bypassing the COM controller.
+This does not need HEC-RAS (or Windows) at all, so it can be used to post-process results anywhere h5py is available.
+
+A ResultReader provides the same result methods as Ras (getResultsArray, getSimData, getLCRSimData), so it can be
+used as the result backend of DataAPI, e.g. API(ras, reader=ResultReader(path)) or API(None, reader=...) for
+post-processing only.
+
+readBatch reads the outputs of many projects (e.g. completed scenario runs) in a process pool into one table.
+"""
+
+import multiprocessing
+import os
+import numpy as np
+from collections import OrderedDict
+from raspy_auto.ras.results import (ResultArrays, TimeSeries, TIME_SERIES_VARIABLES, VARIABLES, dropErrors,
+                                     joinTimeSeries)
+
+STEADY_PATH = "Results/Steady/Output/Output Blocks/Base Output/Steady Profiles"
+XS_ATTRIBUTES = "Geometry/Cross Sections/Attributes"
+XS_ELEVATION_INFO = "Geometry/Cross Sections/Station Elevation Info"
+XS_ELEVATION_VALUES = "Geometry/Cross Sections/Station Elevation Values"
+
+# Datasets (left, channel, right) under the "Cross Sections" output group for each variable.  Each is looked for
+# directly in the group and in its "Additional Variables" subgroup.  Missing overbank datasets read as 0, as overbank
+# values do in COM output for cross sections without overbank flow; a missing channel dataset is an error, as the
+# plan did not write that variable.  None for the maxDepth channel value means it is computed as water surface minus
+# channel invert, matching the COM "Max Chl Dpth" output.
+DATASETS = {
+    "velocity": ("Velocity Left OB", "Velocity Channel", "Velocity Right OB"),
+    "maxDepth": ("Hydraulic Depth Left OB", None, "Hydraulic Depth Right OB"),
+    "flow": ("Flow Left OB", "Flow Channel", "Flow Right OB"),
+    "shear": ("Shear Left OB", "Shear Channel", "Shear Right OB"),
+    "area": ("Area Flow Left OB", "Area Flow Channel", "Area Flow Right OB"),
+    "wp": ("Wetted Perimeter Left OB", "Wetted Perimeter Channel", "Wetted Perimeter Right OB")
+}
+WATER_SURFACE = "Water Surface"
+
+UNSTEADY_PATH = "Results/Unsteady/Output/Output Blocks/Base Output/Unsteady Time Series"
+# Datasets under the unsteady "Cross Sections" group, of shape (time, xs), for each time series variable
+TIME_SERIES_DATASETS = {"wse": "Water Surface", "flow": "Flow", "velocity": "Velocity Channel"}
+# Default number of time steps per read
+TIME_CHUNK = 1024
+
+
+def decode(values):
+    return [v.decode() if isinstance(v, bytes) else str(v) for v in values]
+
+
+class ResultReader(object):
+    """
+    Steady-flow results and unsteady time series read from a HEC-RAS plan HDF file.
+    """
+    def __init__(self, path, datasets = None, chunk = 256):
+        """
+        :param path: path to the plan output file, e.g. project.p01.hdf
+        :param datasets: optional overrides for DATASETS, {variable: (left, channel, right)}
+        :param chunk: number of profiles to read per HDF read
+        """
+        try:
+            import h5py
+        except ImportError:
+            raise ImportError("Reading HEC-RAS output files requires h5py")
+        self.path = path
+        self.file = h5py.File(path, "r")
+        self.datasets = dict(DATASETS)
+        if datasets is not None:
+            self.datasets.update(datasets)
+        self.chunk = chunk
+        attrs = self.file[XS_ATTRIBUTES][()]
+        self.index = list(zip(*[[s.strip() for s in decode(attrs[k])] for k in ["River", "Reach", "RS"]]))
+        self.positions = {key: j for j, key in enumerate(self.index)}
+        self._invert = None
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def outputGroup(self):
+        return self.file[STEADY_PATH]
+
+    def profileNames(self):
+        return [s.strip() for s in decode(self.outputGroup()["Profile Names"][()])]
+
+    def crossSections(self, river = None, reach = None, rs = None):
+        """
+        List the (river, reach, rs) keys matching the given arguments, in file order.  None matches everything.
+        """
+        return [key for key in self.index
+                if all(arg is None or arg == k for arg, k in zip((river, reach, rs), key))]
+
+    def reachKeys(self, river = None, reach = None):
+        """
+        List the (river, reach) pairs matching the given arguments, in file order.  None matches everything.
+        """
+        keys = OrderedDict((key[:2], True) for key in self.crossSections(river, reach))
+        return list(keys)
+
+    def invert(self):
+        # Minimum (channel invert) elevation of each cross section, from the geometry
+        if self._invert is None:
+            info = self.file[XS_ELEVATION_INFO][()]
+            elev = self.file[XS_ELEVATION_VALUES][:, 1]
+            self._invert = np.array([elev[start:start + count].min() for start, count in info[:, :2]])
+        return self._invert
+
+    def findDataset(self, name, group = None):
+        group = self.outputGroup()["Cross Sections"] if group is None else group
+        for path in [name, "Additional Variables/" + name]:
+            if path in group:
+                return group[path]
+        return None
+
+    def readRows(self, dataset, rows, cols):
+        """
+        Read the given (sorted) profile rows and cross section columns of a (profile, xs) dataset, in chunks of
+        contiguous rows so that only the needed part of the file is read.
+        """
+        out = np.empty((len(rows), len(cols)))
+        c0, c1 = cols[0], cols[-1] + 1
+        for start in range(0, len(rows), self.chunk):
+            block = rows[start:start + self.chunk]
+            data = dataset[block[0]:block[-1] + 1, c0:c1]
+            out[start:start + len(block)] = data[block - block[0]][:, cols - c0]
+        return out
+
+    def getResultsArray(self, variables = None, profiles = 1, river = None, reach = None, rs = None):
+        """
+        Retrieve results as dense arrays, as Ras.getResultsArray.
+        :param profiles: profile number or list of profile numbers (1-based, as in the COM interface)
+        :raises ValueError: if the file has no channel output (or, for maxDepth, water surface) for a variable
+        """
+        variables = VARIABLES if variables is None else list(variables)
+        profiles = [profiles] if isinstance(profiles, int) else list(profiles)
+        keys = self.crossSections(river, reach, rs)
+        cols = np.array([self.positions[key] for key in keys], dtype=int)
+        rows = np.array(profiles, dtype=int) - 1
+        order = np.argsort(rows)
+        data = {}
+        for v in variables:
+            arr = np.zeros((len(rows), len(cols), 3))
+            for side, name in enumerate(self.datasets[v]):
+                if len(cols) == 0:
+                    break
+                ds = self.findDataset(WATER_SURFACE if name is None else name)
+                if ds is None:
+                    if side != 1:
+                        continue
+                    raise ValueError("No %s output (%s) in %s" % (v, WATER_SURFACE if name is None else name,
+                                                                  self.path))
+                if name is None:
+                    arr[order, :, side] = self.readRows(ds, rows[order], cols) - self.invert()[cols]
+                else:
+                    arr[order, :, side] = self.readRows(ds, rows[order], cols)
+            data[v] = dropErrors(arr)
+        return ResultArrays(keys, profiles, data)
+
+    def getSimData(self, river = None, reach = None, rs = None, prof = 1):
+        return self.getResultsArray(None, prof, river, reach, rs).simData(river, reach, rs)
+
+    def timeGroup(self):
+        return self.file[UNSTEADY_PATH]
+
+    def timeStamps(self, start = None, end = None):
+        """
+        Labels of the unsteady output time steps (all, or the slice [start:end]).
+        """
+        return [t.strip() for t in decode(self.timeGroup()["Time Date Stamp"][start:end])]
+
+    def iterTimeSeries(self, variables = None, river = None, reach = None, rs = None, start = None, end = None,
+                       chunk = TIME_CHUNK):
+        """
+        Generate unsteady time series in chunks of time steps, reading only those steps and cross sections from the
+        file, so that memory use is bounded by the chunk size.
+        :param variables: list of variables from results.TIME_SERIES_VARIABLES; None for all
+        :param river, reach, rs: as for getResultsArray; None means all
+        :param start, end: window of output time steps, as a slice [start:end] of all the steps (see timeStamps)
+        :param chunk: number of time steps per chunk
+        :return: generator of TimeSeries
+        """
+        variables = TIME_SERIES_VARIABLES if variables is None else list(variables)
+        keys = self.crossSections(river, reach, rs)
+        cols = np.array([self.positions[key] for key in keys], dtype=int)
+        group = self.timeGroup()["Cross Sections"]
+        datasets = {}
+        for v in variables:
+            datasets[v] = self.findDataset(TIME_SERIES_DATASETS[v], group)
+            if datasets[v] is None:
+                raise ValueError("No %s output (%s) in %s" % (v, TIME_SERIES_DATASETS[v], self.path))
+        steps = range(len(self.timeGroup()["Time Date Stamp"]))[start:end]
+        for t0 in range(0, len(steps), chunk):
+            block = steps[t0:t0 + chunk]
+            data = {}
+            for v in variables:
+                if len(cols) == 0:
+                    data[v] = np.zeros((len(block), 0))
+                    continue
+                c0, c1 = cols[0], cols[-1] + 1
+                data[v] = dropErrors(datasets[v][block[0]:block[-1] + 1, c0:c1][:, cols - c0])
+            yield TimeSeries(keys, np.array(block), self.timeStamps(block[0], block[-1] + 1), data)
+
+    def getTimeSeries(self, variables = None, river = None, reach = None, rs = None, start = None, end = None):
+        """
+        Unsteady time series over a window, as one TimeSeries (see iterTimeSeries).
+        """
+        return joinTimeSeries(self.iterTimeSeries(variables, river, reach, rs, start, end), variables,
+                              self.crossSections(river, reach, rs))
+
+    def getLCRSimData(self, river = None, reach = None, rs = None, prof = 1):
+        return self.getResultsArray(None, prof, river, reach, rs).lcrSimData(river, reach, rs)
+
+
+def planOutputPath(projectPath, plan):
+    """
+    Path to the output file of a project's plan.
+    :param plan: plan file number, as an integer (1) or string ("01" or "p01")
+    """
+    if isinstance(plan, int):
+        plan = "%02d" % plan
+    if not plan.startswith("p"):
+        plan = "p" + plan
+    return "%s.%s.hdf" % (os.path.splitext(projectPath)[0], plan)
+
+
+def readSource(job):
+    # Process pool worker: read one scenario's output as columns, or return the error
+    scenario, path, variables, profiles, river, reach, rs, datasets = job
+    try:
+        with ResultReader(path, datasets) as reader:
+            if profiles is None:
+                profiles = range(1, len(reader.profileNames()) + 1)
+            return scenario, reader.getResultsArray(variables, profiles, river, reach, rs).toColumns(), None
+    except Exception as e:
+        return scenario, None, "%s: %r" % (path, e)
+
+
+def readBatch(sources, variables = None, profiles = None, river = None, reach = None, rs = None, workers = None,
+              datasets = None, skipErrors = False):
+    """
+    Read the saved outputs of many projects in parallel, without HEC-RAS, into one table.
+    :param sources: list of (scenario, projectPath, plan), with plan as for planOutputPath; scenario is any
+        (picklable) label
+    :param variables: as for ResultReader.getResultsArray; None for all
+    :param profiles: profile number or list of profile numbers; None for all the profiles in each file
+    :param river, reach, rs: as for ResultReader.getResultsArray; None means all
+    :param workers: number of worker processes; by default, one per CPU.  With 1, files are read in this process.
+    :param datasets: as for ResultReader
+    :param skipErrors: if True, leave out scenarios whose output could not be read (listed in the result's errors)
+        rather than raising an error
+    :return: BatchTable
+    """
+    jobs = [(scenario, planOutputPath(projectPath, plan), variables, profiles, river, reach, rs, datasets)
+            for scenario, projectPath, plan in sources]
+    if workers == 1:
+        parts = [readSource(job) for job in jobs]
+    else:
+        with multiprocessing.Pool(workers) as pool:
+            parts = pool.map(readSource, jobs)
+    errors = [error for scenario, columns, error in parts if error is not None]
+    if len(errors) > 0 and not skipErrors:
+        raise RuntimeError("Could not read %d output file(s): %s" % (len(errors), "; ".join(errors)))
+    parts = [(scenario, columns) for scenario, columns, error in parts if error is None]
+    table = BatchTable(OrderedDict(), errors)
+    if len(parts) > 0:
+        labels = np.empty(len(parts), dtype = object)
+        labels[:] = [scenario for scenario, columns in parts]
+        table.columns["scenario"] = np.repeat(labels, [len(columns["river"]) for scenario, columns in parts])
+        for name in parts[0][1]:
+            table.columns[name] = np.concatenate([columns[name] for scenario, columns in parts])
+    return table
+
+
+class BatchTable(object):
+    """
+    Combined results of readBatch.
+    columns: {column: 1-D array}, with a "scenario" column followed by the columns of ResultArrays.toColumns (river,
+        reach, rs, profile, <variable>_L/_C/_R), rows being in source order
+    errors: messages for the sources that could not be read (with skipErrors)
+    """
+    def __init__(self, columns, errors):
+        self.columns = columns
+        self.errors = errors
+
+    def __getitem__(self, column):
+        return self.columns[column]
+
+    def __len__(self):
+        return len(self.columns["scenario"]) if "scenario" in self.columns else 0
+
+    def scenario(self, scenario):
+        """
+        The rows of one scenario, as {column: array}.
+        """
+        rows = self.columns["scenario"] == scenario
+        return OrderedDict((name, col[rows]) for name, col in self.columns.items())
+
+    def toPandas(self):
+        """
+        The table as a pandas DataFrame.  Requires pandas.
+        """
+        import pandas
+        return pandas.DataFrame(self.columns)
@@ -0,0 +1,174 @@
+"""
+Index of the model topology (rivers, reaches, and cross sections, with their 1-based COM IDs), so that names can
+be resolved to IDs by dictionary lookup rather than by re-querying HEC-RAS.
+"""
+
+import hashlib
+import json
+import os
+from collections import OrderedDict
+
+# The index for a geometry file is cached alongside it, e.g. project.g01.raspy.json
+CACHE_SUFFIX = ".raspy.json"
+
+
+def fileHash(path, blockSize = 1 << 20):
+    """
+    SHA-1 hex digest of a file's contents.
+    """
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        block = f.read(blockSize)
+        while block:
+            h.update(block)
+            block = f.read(blockSize)
+    return h.hexdigest()
+
+
+class GeometryIndex(object):
+    """
+    River/reach/node topology of a geometry.
+    rivers: {river: riverID}
+    reaches: {river: {reach: reachID}}
+    nodes: {(river, reach): {rs: xsID}}, for the reaches whose nodes have been fetched
+    All are ordered as in HEC-RAS.
+    With a RasObject (ras), the nodes of each reach are only fetched when first needed, and each time a reach is
+    fetched the index is saved to its cache (path, key), if any, so that the cache covers the reaches used so far.
+    """
+    def __init__(self, rivers, reaches, nodes, ras = None, cache = None):
+        self.rivers = rivers
+        self.reaches = reaches
+        self.nodes = nodes
+        self.ras = ras
+        self.cache = cache
+
+    @classmethod
+    def build(cls, ras, cache = None):
+        """
+        Build the index from a RasObject with one GetRivers call and one GetReaches call per river.  The nodes of
+        each reach are fetched with one GetNodes call when first needed.
+        :param cache: optional (path, key) to save the index to as reaches are fetched
+        """
+        rivers = OrderedDict()
+        reaches = OrderedDict()
+        for riverID, river in enumerate(ras.GetRivers()[1], 1):
+            river = river.strip()
+            rivers[river] = riverID
+            reaches[river] = OrderedDict()
+            for reachID, reach in enumerate(ras.GetReaches(riverID)[2], 1):
+                reaches[river][reach.strip()] = reachID
+        return cls(rivers, reaches, {}, ras, cache)
+
+    def reachNodes(self, river, reach):
+        """
+        :return: {rs: xsID} for the reach, fetching it if needed
+        """
+        key = (river, reach)
+        if key not in self.nodes:
+            riverID = self.rivers[river]
+            reachID = self.reaches[river][reach]
+            self.nodes[key] = OrderedDict(
+                (rs.strip(), xsID) for xsID, rs in enumerate(self.ras.GetNodes(riverID, reachID)[3], 1))
+            if self.cache is not None:
+                try:
+                    self.save(*self.cache)
+                except OSError:
+                    pass
+        return self.nodes[key]
+
+    def isComplete(self):
+        return len(self.nodes) == sum(len(rchs) for rchs in self.reaches.values())
+
+    def complete(self):
+        """
+        Fetch the nodes of all reaches not yet fetched.
+        """
+        for river, rchs in self.reaches.items():
+            for reach in rchs:
+                self.reachNodes(river, reach)
+        return self
+
+    def riverNames(self):
+        return list(self.rivers.keys())
+
+    def reachNames(self, river):
+        return list(self.reaches[river].keys())
+
+    def stations(self, river, reach):
+        return list(self.reachNodes(river, reach).keys())
+
+    def riverID(self, river):
+        return self.rivers[river]
+
+    def reachID(self, river, reach):
+        return self.reaches[river][reach]
+
+    def xsID(self, river, reach, rs):
+        return self.reachNodes(river, reach)[rs]
+
+    def toJSON(self):
+        # The nodes of reaches not fetched yet are null
+        return [[river, riverID, [[reach, reachID, list(self.nodes[(river, reach)].items())
+                                   if (river, reach) in self.nodes else None]
+                                  for reach, reachID in self.reaches[river].items()]]
+                for river, riverID in self.rivers.items()]
+
+    @classmethod
+    def fromJSON(cls, data):
+        rivers = OrderedDict()
+        reaches = OrderedDict()
+        nodes = OrderedDict()
+        for river, riverID, rchs in data:
+            rivers[river] = riverID
+            reaches[river] = OrderedDict()
+            for reach, reachID, xses in rchs:
+                reaches[river][reach] = reachID
+                if xses is not None:
+                    nodes[(river, reach)] = OrderedDict((rs, xsID) for rs, xsID in xses)
+        return cls(rivers, reaches, nodes)
+
+    def save(self, path, key):
+        """
+        Write the index to path, tagged with key (the geometry file hash), first adding any reaches that another
+        process has saved to it under the same key.  The file is replaced atomically so that concurrent readers never
+        see a partially written cache.
+        """
+        saved = self.load(path, key)
+        if saved is not None:
+            for reachKey, xses in saved.nodes.items():
+                self.nodes.setdefault(reachKey, xses)
+        tmp = "%s.%d.tmp" % (path, os.getpid())
+        with open(tmp, "w") as f:
+            json.dump({"key": key, "rivers": self.toJSON()}, f, separators=(",", ":"))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path, key):
+        """
+        Load a cached index from path, if it exists and was saved with the same key; otherwise return None.  The
+        cache may not include the nodes of every reach.
+        """
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if data.get("key") != key:
+            return None
+        return cls.fromJSON(data["rivers"])
+
+    @classmethod
+    def cached(cls, ras, geomPath):
+        """
+        Load the index for the given geometry file from its on-disk cache, rebuilding it from the RasObject if the
+        geometry file has changed since it was cached.  Reaches missing from the cache are fetched from the RasObject
+        when needed, and added to the cache.
+        """
+        path = geomPath + CACHE_SUFFIX
+        key = fileHash(geomPath)
+        index = cls.load(path, key)
+        if index is None:
+            return cls.build(ras, (path, key))
+        index.ras = ras
+        index.cache = (path, key)
+        return index
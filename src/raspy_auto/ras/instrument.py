@@ -0,0 +1,196 @@
+"""
+Opt-in instrumentation of HEC-RAS controller calls.  When enabled on a RasObject (RasObject.enableInstrumentation),
+the controller is wrapped so that every COM call records its count, cumulative time, and a latency histogram, per
+COM method and per calling API operation.  When disabled, the RasObject uses the controller directly, so there is no
+overhead.
+
+    inst = ras.enableInstrumentation()
+    api.params.modifyN(...)
+    api.ops.compute()
+    print(inst.formatTable())
+"""
+
+import functools
+import inspect
+import json
+import threading
+import time
+
+# Upper bounds (seconds) of the latency histogram buckets; the last bucket is unbounded
+BUCKETS = [1e-5, 1e-4, 1e-3, 1e-2, 1e-1, 1.0, 10.0]
+NO_OPERATION = "(none)"
+
+
+class MethodStats(object):
+    """
+    Statistics for one (operation, COM method) pair.
+    """
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.histogram = [0] * (len(BUCKETS) + 1)
+
+    def add(self, seconds):
+        self.count += 1
+        self.seconds += seconds
+        bucket = 0
+        while bucket < len(BUCKETS) and seconds > BUCKETS[bucket]:
+            bucket += 1
+        self.histogram[bucket] += 1
+
+
+class Instrumentation(object):
+    """
+    Collected COM call statistics.  Calls are attributed to the outermost API operation in progress on the calling
+    thread (see operation), or to "(none)".
+    """
+    def __init__(self):
+        self.stats = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def stack(self):
+        if not hasattr(self.local, "stack"):
+            self.local.stack = []
+        return self.local.stack
+
+    def record(self, method, seconds):
+        stack = self.stack()
+        key = (stack[0] if stack else NO_OPERATION, method)
+        with self.lock:
+            if key not in self.stats:
+                self.stats[key] = MethodStats()
+            self.stats[key].add(seconds)
+
+    def operation(self, name):
+        """
+        Context manager attributing calls made inside it to the named operation.
+        """
+        return OperationContext(self, name)
+
+    def reset(self):
+        with self.lock:
+            self.stats = {}
+
+    def byMethod(self):
+        """
+        :return: {method: MethodStats}, summed over operations
+        """
+        totals = {}
+        for (op, method), stats in self.stats.items():
+            total = totals.setdefault(method, MethodStats())
+            total.count += stats.count
+            total.seconds += stats.seconds
+            total.histogram = [a + b for a, b in zip(total.histogram, stats.histogram)]
+        return totals
+
+    def toDict(self):
+        return {
+            "buckets": BUCKETS,
+            "calls": [{"operation": op, "method": method, "count": stats.count, "seconds": stats.seconds,
+                       "histogram": stats.histogram}
+                      for (op, method), stats in sorted(self.stats.items())]
+        }
+
+    def toJSON(self, path = None):
+        """
+        Export the statistics as JSON, returning the text, and also writing it to path if given.
+        """
+        text = json.dumps(self.toDict(), indent = 2)
+        if path is not None:
+            with open(path, "w") as f:
+                f.write(text)
+        return text
+
+    def formatTable(self):
+        """
+        Summary table by operation and COM method, slowest first.
+        """
+        lines = ["%-28s %-28s %8s %10s %10s" % ("operation", "method", "calls", "seconds", "mean ms")]
+        for (op, method), stats in sorted(self.stats.items(), key = lambda kv: -kv[1].seconds):
+            lines.append("%-28s %-28s %8d %10.4f %10.3f" % (op, method, stats.count, stats.seconds,
+                                                           1000 * stats.seconds / stats.count))
+        return "\n".join(lines)
+
+
+class OperationContext(object):
+    def __init__(self, instrumentation, name):
+        self.instrumentation = instrumentation
+        self.name = name
+
+    def __enter__(self):
+        self.instrumentation.stack().append(self.name)
+        return self
+
+    def __exit__(self, *args):
+        self.instrumentation.stack().pop()
+        return False
+
+
+class InstrumentedController(object):
+    """
+    Wraps a HEC-RAS controller, timing every method call.
+    """
+    def __init__(self, controller, instrumentation):
+        self.controller = controller
+        self.instrumentation = instrumentation
+
+    def __getattr__(self, name):
+        attr = getattr(self.controller, name)
+        if not callable(attr):
+            return attr
+        instrumentation = self.instrumentation
+
+        def timed(*args):
+            start = time.perf_counter()
+            try:
+                return attr(*args)
+            finally:
+                instrumentation.record(name, time.perf_counter() - start)
+        return timed
+
+
+def apiOperations(prefix):
+    """
+    Class decorator for the API classes: attribute COM calls made by each public method to "<prefix>.<method>" when
+    the underlying RasObject is instrumented.  Otherwise, methods run as-is.
+    """
+    def decorate(cls):
+        for name, func in list(cls.__dict__.items()):
+            if callable(func) and not name.startswith("__"):
+                setattr(cls, name, wrapOperation(func, "%s.%s" % (prefix, name)))
+        return cls
+    return decorate
+
+
+def wrapOperation(func, name):
+    if inspect.isgeneratorfunction(func):
+        return wrapGenerator(func, name)
+
+    @functools.wraps(func)
+    def wrapped(self, *args, **kwargs):
+        instrumentation = getattr(getattr(self.ras, "ras", None), "instrumentation", None)
+        if instrumentation is None:
+            return func(self, *args, **kwargs)
+        with instrumentation.operation(name):
+            return func(self, *args, **kwargs)
+    return wrapped
+
+
+def wrapGenerator(func, name):
+    # As wrapOperation, but attributing the calls made while producing each item, not those made by the consumer
+    @functools.wraps(func)
+    def wrapped(self, *args, **kwargs):
+        gen = func(self, *args, **kwargs)
+        while True:
+            instrumentation = getattr(getattr(self.ras, "ras", None), "instrumentation", None)
+            try:
+                if instrumentation is None:
+                    item = next(gen)
+                else:
+                    with instrumentation.operation(name):
+                        item = next(gen)
+            except StopIteration:
+                return
+            yield item
+    return wrapped
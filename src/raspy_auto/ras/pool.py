@@ -0,0 +1,191 @@
+"""
+A pool of warm HEC-RAS controllers.  Starting a controller launches a HEC-RAS process, which takes seconds, so rather
+than creating a new controller for every Ras, controllers are kept alive and leased out through Ras's rasObject
+parameter:
+
+    with ControllerPool(size = 2) as pool:
+        for scenario in scenarios:
+            with pool.ras(projectPath) as ras:
+                api = API(ras)
+                ...
+
+Leased controllers are health-checked with a cheap call (Project_Current) and replaced if they fail it, and can be
+retired after a number of leases to limit leaks in long runs.  A project is only reopened if the leased controller
+has a different one open.
+
+COM controllers belong to the thread that created them, so a pool should be used from a single thread.
+"""
+
+import threading
+import time
+
+from raspy_auto.ras.ras import Ras
+from raspy_auto.ras.wrapper import RasObject
+
+
+class PooledController(object):
+    """
+    A controller (RasObject) in the pool, with the number of times it has been leased.
+    """
+    def __init__(self, rasObject):
+        self.rasObject = rasObject
+        self.leases = 0
+
+
+class ControllerPool(object):
+    """
+    Keeps up to size controllers alive, leasing them out with acquire/release, lease, or ras.  stats counts
+    controllers created and retired (unhealthy or worn out), and health checks failed.
+    """
+    def __init__(self, size = 2, which = "507", factory = None, maxLeases = None, warm = True):
+        """
+        :param size: maximum number of controllers
+        :param which: HEC-RAS version, as for Ras
+        :param factory: optional function returning a new RasObject (or compatible); by default, a new HEC-RAS
+            controller of the given version
+        :param maxLeases: if given, retire a controller after this many leases, replacing it with a new one
+        :param warm: whether to start all the controllers when the pool starts, rather than as needed
+        """
+        self.size = size
+        self.which = which
+        self.factory = factory
+        self.maxLeases = maxLeases
+        self.warm = warm
+        self.idle = []
+        self.leased = {}
+        self.condition = threading.Condition()
+        self.stats = {"created": 0, "retired": 0, "failedChecks": 0}
+        self.closed = False
+
+    def create(self):
+        self.stats["created"] += 1
+        if self.factory is not None:
+            return PooledController(self.factory())
+        return PooledController(RasObject("RAS%s.HECRASController" % self.which))
+
+    def retire(self, controller):
+        self.stats["retired"] += 1
+        try:
+            controller.rasObject.QuitRas()
+        except Exception:
+            pass
+
+    def healthy(self, controller):
+        """
+        Check that a controller still responds, with a cheap call.
+        """
+        try:
+            controller.rasObject.CurrentProject()
+            return True
+        except Exception:
+            self.stats["failedChecks"] += 1
+            return False
+
+    def start(self):
+        if self.warm:
+            with self.condition:
+                while len(self.idle) + len(self.leased) < self.size:
+                    self.idle.append(self.create())
+        return self
+
+    def acquire(self, timeout = None):
+        """
+        Lease a healthy controller, waiting for one to be released if all are in use.
+        :param timeout: maximum time to wait, in seconds
+        :return: RasObject, to be given back with release
+        :raises TimeoutError: if none became available in time
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            while True:
+                if self.closed:
+                    raise RuntimeError("Controller pool is closed")
+                if len(self.idle) > 0:
+                    controller = self.idle.pop()
+                    if self.healthy(controller):
+                        break
+                    self.retire(controller)
+                    continue
+                if len(self.leased) < self.size:
+                    controller = self.create()
+                    break
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError("No HEC-RAS controller became available within %.1f s" % timeout)
+                self.condition.wait(remaining)
+            controller.leases += 1
+            self.leased[id(controller.rasObject)] = controller
+            return controller.rasObject
+
+    def release(self, rasObject, discard = False):
+        """
+        Return a leased controller to the pool.
+        :param discard: retire the controller rather than reusing it (e.g. if it misbehaved)
+        """
+        with self.condition:
+            controller = self.leased.pop(id(rasObject))
+            worn = self.maxLeases is not None and controller.leases >= self.maxLeases
+            if discard or worn or self.closed:
+                self.retire(controller)
+            else:
+                self.idle.append(controller)
+            self.condition.notify()
+
+    def lease(self, timeout = None):
+        """
+        Context manager leasing a controller (RasObject) for the duration of a with block.
+        """
+        return Lease(self, timeout)
+
+    def ras(self, projectPath, timeout = None, **kwargs):
+        """
+        Context manager leasing a controller as a Ras for the given project.  The project is only opened if the
+        controller has a different one open.
+        :param kwargs: other arguments for Ras (e.g. geomCache)
+        """
+        return Lease(self, timeout, projectPath, kwargs)
+
+    def close(self):
+        """
+        Quit the idle controllers; leased controllers are quit when released.
+        """
+        with self.condition:
+            self.closed = True
+            for controller in self.idle:
+                self.retire(controller)
+            self.idle = []
+            self.condition.notify_all()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class Lease(object):
+    """
+    A controller leased from a ControllerPool for a with block, as a RasObject, or as a Ras if projectPath is given.
+    """
+    def __init__(self, pool, timeout = None, projectPath = None, kwargs = None):
+        self.pool = pool
+        self.timeout = timeout
+        self.projectPath = projectPath
+        self.kwargs = kwargs if kwargs is not None else {}
+        self.rasObject = None
+
+    def __enter__(self):
+        self.rasObject = self.pool.acquire(self.timeout)
+        if self.projectPath is None:
+            return self.rasObject
+        try:
+            return Ras(self.projectPath, self.pool.which, self.rasObject, reopen = False, **self.kwargs)
+        except Exception:
+            self.pool.release(self.rasObject, discard = True)
+            raise
+
+    def __exit__(self, excType, excValue, traceback):
+        # A controller that fails its health check after an error is retired now rather than on its next lease
+        discard = excType is not None and not self.pool.healthy(self.pool.leased[id(self.rasObject)])
+        self.pool.release(self.rasObject, discard)
+        return False
@@ -13,13 +13,23 @@ rasObj.reach(river, reach, geom = None) - returning the relevant reach.  If geom
 rasObj.openProject(projectPath) - open the relevant project
 rasObj.setPlan(plan) - set the plan to that one (by ID or file number)
 rasObj.setGeom(geom) - set the plan geometry file/active geometry file (by ID or file number)
-rasObj.computeSteady, computeUnsteady(plan = None) - run the plan (optional) or, if plan is None, the currently active plan
+rasObj.computeSteady, computeUnsteady(plan = None, blocking = True) - run the plan (optional) or, if plan is None, the
+    currently active plan, returning the controller's result (success, number of messages, (messages), blocking mode).
+    If not blocking, return once the run has started; rasObj.computeIsComplete() tells when it has finished.
 rasObj.exit() - exit HEC-RAS
 rasObj.newPlan(planId) - create a new plan with the given ID and make it the active plan
 rasObj.set<Steady/Unsteady>Flow(flow) - set the steady/unsteady flow file (by ID or file number)
 rasObj.getSimData(river = None, reach = None, rs = None): get the simulation flow data for a given river, reach, and river station.
     If rs is none, return a dictionary of all the river stations' data.  Likewise river and reach (nested dictionaries).
     Simulation flow data should be as a simdata class.
+rasObj.getResultsArray(variables = None, profiles = 1, river = None, reach = None, rs = None): get the given variables
+    (velocity, maxDepth, flow, shear, area, wp) for many cross sections and profiles as arrays of shape
+    (profile, xs, L/C/R).  Should return a ResultArrays object (see ras/results.py).
+rasObj.reachKeys(river = None, reach = None): list the (river, reach) pairs matching the given arguments, in order.
+rasObj.readFile(path), writeFile(path, text): read (None if missing) or write a project file, e.g. the flow file
+rasObj.getTimeSeries(variables = None, river = None, reach = None, rs = None, start = None, end = None): get unsteady
+    time series (wse, flow, velocity) over a window of output time steps as arrays of shape (time, xs), as a
+    TimeSeries object (see ras/results.py); iterTimeSeries(..., chunk) generates them in chunks of time steps.
 
 reach - containing a reach in the geometry file
 reach.xses - return a list of cross sections
@@ -33,19 +43,74 @@ xs.setMainChannelManning(n): set the main channel n to the given n
 """
 
 from raspy_auto.ras.wrapper import RasObject
+from raspy_auto.ras.index import GeometryIndex
+from raspy_auto.ras.results import ResultArrays, ResultCache, SimData, VARIABLES, padLCR, dropErrors
+from raspy_auto.ras.results import TimeSeries, TIME_SERIES_VARIABLES, joinTimeSeries
+from raspy_auto.ras.trace import TraceMismatch
+import numpy as np
+import os
+import time
+from collections import OrderedDict
+
+# Position of each raw variable in the Output_VelDist result tuple
+VELDIST_FIELDS = {"area": -4, "wp": -5, "flow": -3, "hydDepth": -2, "velocity": -1}
+# Raw variables (as fetched and memoized) that each result variable is derived from.  maxDepth is the hydraulic
+# depth distribution with the channel value replaced by the maximum channel depth (chDepth).
+SOURCES = {"velocity": ["velocity"], "flow": ["flow"], "area": ["area"], "wp": ["wp"],
+           "maxDepth": ["hydDepth", "chDepth"], "shear": ["shear"]}
+RAW_VARIABLES = list(VELDIST_FIELDS) + ["chDepth", "shear"]
+# Raw variables from each COM call: Output_VelDist, and Output_NodeOutput of max channel depth and of shear.  Results
+# are memoized as one entry per cross section, profile, and call.
+CALL_FIELDS = OrderedDict([("veldist", list(VELDIST_FIELDS)), ("chDepth", ["chDepth"]), ("shear", ["shear"])])
+# HEC-RAS output variable names (see Output_Variables) of the time series variables
+TIME_SERIES_NAMES = {"wse": "W.S. Elev", "flow": "Q Total", "velocity": "Vel Chnl"}
+# Default number of time steps per chunk
+TIME_CHUNK = 100
 
 class Ras(object):
     """
     The whole RAS controller.
     """
-    def __init__(self, projectPath, which="507", rasObject = None):
+    def __init__(self, projectPath, which="507", rasObject = None, geomCache = True, resultCacheSize = 300000,
+                 reopen = True):
+        """
+        :param projectPath: path to the project (.prj) file; if None, use the project already open
+        :param which: HEC-RAS version string, e.g. "507" or "631"
+        :param rasObject: RasObject (or compatible) to use instead of creating a new controller
+        :param geomCache: whether to cache the model topology on disk, next to the geometry file.  Not used while
+            calls are recorded or replayed (see trace.py), so that the topology is part of the trace.
+        :param resultCacheSize: maximum number of memoized results (one per cross section, profile, and COM call, so
+            at most 3 per cross section and profile); 0 to disable.  The default covers every result of a run of 1000
+            cross sections by 100 profiles.  Results are memoized until the next compute, roughness or flow change,
+            or project open.
+        :param reopen: whether to open the project even if the controller already has it open (e.g. a controller
+            reused from a ControllerPool); if False, it is only opened if a different project (or none) is open
+        """
         rasBase = "RAS%s.HECRASController"
         self.ras = rasObject if rasObject is not None else\
             RasObject(rasBase % which)
+        self.geomCache = geomCache
+        self.resultCache = ResultCache(resultCacheSize)
+        # Last applied (left, channel, right) n by (river, reach, rs) for the current geometry (see selectManning),
+        # queued writes while batching, and counts of cross section writes made and skipped as unchanged
+        self.manningByGeom = {}
+        self.manningGeom = None
+        self.manning = {}
+        self.pendingManning = None
+        self.manningStats = {"written": 0, "skipped": 0}
+        # Flow reload timings: {method: [count, total seconds]}, and (method, seconds) of the last reload
+        self.reloadStats = {}
+        self.lastReload = None
+        # Output variable numbers by name, looked up when first needed
+        self.variableCodes = None
         try:
             if not (projectPath is None):
-                self.openProject(projectPath)
-            self.rivers = [River(self.ras, river.strip()) for river in self.ras.GetRivers()[1]]
+                if reopen or not samePath(self.currentProject(), projectPath):
+                    self.openProject(projectPath)
+            self.loadGeometry()
+        except TraceMismatch:
+            # A replay that has diverged from its trace can't continue
+            raise
         except Exception:
             print("Opening RAS failed")
             try:
@@ -53,8 +118,67 @@ class Ras(object):
             except Exception:
                 pass
 
+    def loadGeometry(self):
+        """
+        Index the model topology, from the on-disk cache if the geometry file has not changed since it was cached.
+        River, Reach, and XS objects are created when first accessed, and cross sections are only fetched from
+        HEC-RAS for the reaches used.
+        """
+        geomPath = None
+        if self.geomCache and not getattr(self.ras, "traced", False):
+            try:
+                geomPath = self.currentGeomFile()
+            except Exception:
+                pass
+        if geomPath and os.path.isfile(geomPath):
+            self.index = GeometryIndex.cached(self.ras, geomPath)
+        else:
+            self.index = GeometryIndex.build(self.ras)
+        self.riverLookup = {}
+        self.selectManning()
+
+    @property
+    def rivers(self):
+        return [self.river(river) for river in self.index.riverNames()]
+
+    def selectManning(self):
+        """
+        Switch the record of applied Manning's n (manning) to the current geometry.  A record is kept for each
+        geometry file, and discarded if the file has since changed other than by writes through this object (e.g. by
+        ParamsAPI.modifyNFile or in the HEC-RAS editor).
+        """
+        try:
+            path = self.currentGeomFile()
+        except Exception:
+            path = None
+        stamp = fileStamp(path)
+        entry = self.manningByGeom.get(path)
+        if entry is None or entry[0] != stamp:
+            entry = [stamp, {}]
+            self.manningByGeom[path] = entry
+        self.manningGeom = path
+        self.manning = entry[1]
+
+    def manningSaved(self):
+        # The geometry file was saved with the recorded n, so the record is still valid for the file as it now is
+        entry = self.manningByGeom.get(self.manningGeom)
+        if entry is not None:
+            entry[0] = fileStamp(self.manningGeom)
+
+    def enableInstrumentation(self, instrumentation = None):
+        """
+        Record COM call counts and timings, by method and calling API operation.
+        :return: Instrumentation (see instrument.py), e.g. for formatTable() or toJSON()
+        """
+        return self.ras.enableInstrumentation(instrumentation)
+
+    def disableInstrumentation(self):
+        self.ras.disableInstrumentation()
+
     def openProject(self, path):
         self.ras.OpenProject(path)
+        self.invalidateResults()
+        self.selectManning()
 
     def quit(self):
         self.ras.QuitRas()
@@ -62,140 +186,385 @@ class Ras(object):
     def currentProject(self):
         return self.ras.CurrentProject()
 
+    def currentPlanFile(self):
+        return self.ras.CurrentPlanFile()
+
+    def setPlan(self, plan):
+        """
+        Set the current plan, by title.
+        :return: whether HEC-RAS accepted the plan
+        """
+        self.invalidateResults()
+        result = self.ras.SetPlan(plan)
+        # The plan may use a different geometry
+        self.selectManning()
+        return result
+
+    def reloadFlow(self, method = "restart", profiles = None):
+        """
+        Make HEC-RAS use flow files that were edited on disk.
+        :param method: "restart" to quit and reopen the project, which is known to make HEC-RAS re-read the flow
+            file; or "plan" (experimental) to re-select the current plan instead, which avoids the restart but has not
+            been confirmed to make HEC-RAS re-read the file.  "plan" falls back to a restart if re-selecting fails or
+            HEC-RAS's steady flow profile count afterwards differs from profiles.
+        :param profiles: the number of profiles in the edited steady flow file, to check a "plan" reload against.
+            This only catches stale flow data with a different profile count.
+        :return: the method actually used.  Timings are recorded in lastReload and reloadStats.
+        """
+        start = time.monotonic()
+        used = "restart"
+        if method == "plan":
+            try:
+                if self.setPlan(planTitle(self.readFile(self.currentPlanFile()))):
+                    if profiles is None or self.ras.SteadyProfileCount() == profiles:
+                        used = "plan"
+            except Exception:
+                pass
+        if used == "restart":
+            projPath = self.currentProject()
+            self.quit()
+            self.openProject(projPath)
+        elapsed = time.monotonic() - start
+        self.lastReload = (used, elapsed)
+        stats = self.reloadStats.setdefault(used, [0, 0.0])
+        stats[0] += 1
+        stats[1] += elapsed
+        return used
+
+    def currentGeomFile(self):
+        return self.ras.CurrentGeomFile()
+
+    def readFile(self, path):
+        """
+        Read a project file (e.g. a plan or flow file) through the controller, so that it is part of any trace.
+        :return: the file's text, or None if it does not exist
+        """
+        return self.ras.ReadFile(path)
+
+    def writeFile(self, path, text):
+        # Write a project file through the controller, as readFile
+        self.ras.WriteFile(path, text)
+
     def save(self):
         self.ras.Save()
 
     def river(self, river, geom = None):
-        return [riv for riv in self.rivers if riv.river == river][0]
+        if river not in self.riverLookup:
+            self.riverLookup[river] = River(self.ras, river, self.index, self)
+        return self.riverLookup[river]
 
     def reach(self, river, reach, geom = None):
         # Geom not implemented yet.
         return self.river(river, geom).reach(reach)
 
-    def computeSteady(self, plan = None):
-        self.ras.Compute()
+    def setMannLCR(self, river, reach, rs, left, channel, right):
+        """
+        Set left, main channel, and right Manning's n for a cross section, unless they are already applied.  Inside a
+        batch, the write is queued until the batch ends.
+        :return: whether the n was written (or queued), rather than skipped as unchanged
+        """
+        key = (river, reach, rs)
+        ns = (left, channel, right)
+        if self.pendingManning is not None:
+            if key not in self.pendingManning and self.manning.get(key) == ns:
+                self.manningStats["skipped"] += 1
+                return False
+            self.pendingManning[key] = ns
+            return True
+        if self.manning.get(key) == ns:
+            self.manningStats["skipped"] += 1
+            return False
+        self.ras.SetMannLCR(river, reach, rs, left, channel, right)
+        self.manning[key] = ns
+        self.manningStats["written"] += 1
+        self.manningSaved()
+        self.invalidateResults()
+        return True
+
+    def batch(self):
+        """
+        Batch Manning's n writes: within `with ras.batch():`, writes are queued, and on exit those that change the
+        last known n are written, followed by a single project save.
+        :return: ManningBatch context manager, which records the writes, skips, and saves performed
+        """
+        return ManningBatch(self)
 
-    def computeUnsteady(self, plan = None):
-        self.ras.Compute()
+    def computeSteady(self, plan = None, blocking = True):
+        # Returns the controller's result: (success, number of messages, (messages), blocking mode).  If not blocking,
+        # returns once the run has started (see computeIsComplete).
+        self.invalidateResults()
+        return self.ras.Compute(blocking)
+
+    def computeUnsteady(self, plan = None, blocking = True):
+        self.invalidateResults()
+        return self.ras.Compute(blocking)
 
     def computeIsComplete(self):
         return self.ras.Complete()
 
+    def cancelCompute(self):
+        self.ras.CancelCompute()
+
+    def crossSections(self, river = None, reach = None, rs = None):
+        """
+        List the cross sections matching the given river, reach, and rs, in model order.  Unspecified (None) arguments
+        match everything.
+        """
+        rivers = self.rivers if river is None else [self.river(river)]
+        result = []
+        for riv in rivers:
+            reaches = riv.reaches if reach is None else [riv.reach(reach)]
+            for rch in reaches:
+                if rs is None:
+                    result += rch.xses
+                else:
+                    result += [xs for xs in rch.xses if xs.rs == rs]
+        return result
+
+    def reachKeys(self, river = None, reach = None):
+        """
+        List the (river, reach) pairs matching the given arguments, in model order.  None matches everything.
+        """
+        rivers = self.rivers if river is None else [self.river(river)]
+        return [(riv.river, rch.reach) for riv in rivers
+                for rch in (riv.reaches if reach is None else [riv.reach(reach)])]
+
+    def getResultsArray(self, variables = None, profiles = 1, river = None, reach = None, rs = None):
+        """
+        Retrieve results for many cross sections and profiles at once as dense arrays.
+        :param variables: list of variable names (see results.VARIABLES); None for all of them.  Only the COM calls
+            needed for the requested variables are made.
+        :param profiles: profile number or list of profile numbers (1-based)
+        :param river, reach, rs: as for getSimData; None means all
+        :return: ResultArrays, with an array of shape (profile, xs, 3) for each variable
+        """
+        variables = VARIABLES if variables is None else list(variables)
+        profiles = [profiles] if isinstance(profiles, int) else list(profiles)
+        xses = self.crossSections(river, reach, rs)
+        shape = (len(profiles), len(xses), 3)
+        needed = set(k for v in variables for k in SOURCES[v])
+        calls = [call for call, ks in CALL_FIELDS.items() if len(needed.intersection(ks)) > 0]
+        raw = {k: np.zeros(shape) for k in RAW_VARIABLES}
+        counts = np.zeros(shape[:2], dtype=int)
+        fetched = {call: np.zeros(shape[:2], dtype=bool) for call in CALL_FIELDS}
+        cached = []
+        for j, xs in enumerate(xses):
+            for i, prof in enumerate(profiles):
+                # Each call for an (xs, profile) pair is made at most once per compute, for all the variables it gives
+                missing = set()
+                for call in calls:
+                    entry = self.resultCache.get((xs.river, xs.reach, xs.rs, prof, call))
+                    if entry is None:
+                        missing.add(call)
+                    else:
+                        cached.append((call, i, j, entry))
+                if "veldist" in missing:
+                    sd = self.ras.GetVelDist(xs.riverID, xs.reachID, xs.xsID, 0, prof)
+                    # sd: (6x args, (left station), (right station), (conv perc), (area), (wetted perimeter), (flow),
+                    # (depth), (velocity))
+                    count = len(sd[-1])
+                    if count > 3 or count == 2:
+                        # Without the bank stations, the slices can't be assigned to left/channel/right
+                        raise ValueError("HEC-RAS returned %d flow distribution slices for %s %s %s, profile %d; only "
+                                         "1 (channel) or 3 (left, channel, right) can be read.  Set the flow "
+                                         "distribution to one slice per subsection." %
+                                         (count, xs.river, xs.reach, xs.rs, prof))
+                    for k, field in VELDIST_FIELDS.items():
+                        values = sd[field]
+                        raw[k][i, j, :len(values)] = values
+                    counts[i, j] = count
+                    fetched["veldist"][i, j] = True
+                if "chDepth" in missing:
+                    # Needed to get max chl. depth instead of hydraulic depth
+                    raw["chDepth"][i, j, 1] = self.ras.GetNodeOutput(xs.riverID, xs.reachID, xs.xsID, None,
+                                                                     prof, 4)[0]
+                    fetched["chDepth"][i, j] = True
+                if "shear" in missing:
+                    raw["shear"][i, j] = [self.ras.GetNodeOutput(xs.riverID, xs.reachID, xs.xsID, None,
+                                                                 prof, nVar)[0] for nVar in (151, 152, 153)]
+                    fetched["shear"][i, j] = True
+        for k in VELDIST_FIELDS:
+            padLCR(raw[k], counts)
+        dropErrors(raw["shear"])
+        if self.resultCache.maxsize > 0:
+            for call, ks in CALL_FIELDS.items():
+                for i, j in zip(*np.nonzero(fetched[call])):
+                    xs = xses[j]
+                    self.resultCache.put((xs.river, xs.reach, xs.rs, profiles[i], call),
+                                         np.array([raw[k][i, j] for k in ks]))
+        for call, i, j, entry in cached:
+            for k, values in zip(CALL_FIELDS[call], entry):
+                raw[k][i, j] = values
+        data = {}
+        for v in variables:
+            if v == "maxDepth":
+                data[v] = raw["hydDepth"].copy()
+                data[v][..., 1] = raw["chDepth"][..., 1]
+            else:
+                data[v] = raw[v]
+        return ResultArrays([(xs.river, xs.reach, xs.rs) for xs in xses], profiles, data)
+
+    def variableCode(self, name):
+        """
+        :return: the Output_NodeOutput variable number of the named HEC-RAS output variable (e.g. "W.S. Elev")
+        """
+        if self.variableCodes is None:
+            names = self.ras.GetVariables()[1]
+            self.variableCodes = {n.strip(): code for code, n in enumerate(names, 1)}
+        return self.variableCodes[name]
+
+    def timeSteps(self):
+        """
+        The output time steps of the current (unsteady) plan, as [(profile number, label)].
+        """
+        names = self.ras.GetProfiles()[1]
+        return [(prof, name.strip()) for prof, name in enumerate(names, 1) if name.strip() != "Max WS"]
+
+    def iterTimeSeries(self, variables = None, river = None, reach = None, rs = None, start = None, end = None,
+                       chunk = TIME_CHUNK):
+        """
+        Generate unsteady time series in chunks of time steps, so that memory use is bounded by the chunk size.  This
+        makes one Output_NodeOutput call per time step, cross section, and variable; reading the plan output file
+        with ResultReader.iterTimeSeries is much faster where available.
+        :param variables: list of variables from results.TIME_SERIES_VARIABLES; None for all
+        :param river, reach, rs: as for getSimData; None means all
+        :param start, end: window of output time steps, as a slice [start:end] of timeSteps()
+        :param chunk: number of time steps per chunk
+        :return: generator of TimeSeries
+        """
+        variables = TIME_SERIES_VARIABLES if variables is None else list(variables)
+        codes = {v: self.variableCode(TIME_SERIES_NAMES[v]) for v in variables}
+        xses = self.crossSections(river, reach, rs)
+        index = [(xs.river, xs.reach, xs.rs) for xs in xses]
+        allSteps = self.timeSteps()
+        steps = range(len(allSteps))[start:end]
+        for t0 in range(0, len(steps), chunk):
+            block = steps[t0:t0 + chunk]
+            data = {v: np.zeros((len(block), len(xses))) for v in variables}
+            for i, step in enumerate(block):
+                prof = allSteps[step][0]
+                for j, xs in enumerate(xses):
+                    for v, code in codes.items():
+                        data[v][i, j] = self.ras.GetNodeOutput(xs.riverID, xs.reachID, xs.xsID, None, prof, code)[0]
+            for v in variables:
+                dropErrors(data[v])
+            yield TimeSeries(index, np.array(block), [allSteps[step][1] for step in block], data)
+
+    def getTimeSeries(self, variables = None, river = None, reach = None, rs = None, start = None, end = None):
+        """
+        Unsteady time series over a window, as one TimeSeries (see iterTimeSeries).
+        """
+        return joinTimeSeries(self.iterTimeSeries(variables, river, reach, rs, start, end), variables,
+                              [(xs.river, xs.reach, xs.rs) for xs in self.crossSections(river, reach, rs)])
+
+    def invalidateResults(self):
+        """
+        Discard memoized results; called whenever the results HEC-RAS would return may have changed.
+        """
+        self.resultCache.clear()
+
     def getSimData(self, river = None, reach = None, rs = None, prof = 1):
         # Single values only.
-        mainchan = lambda x: x[0] if len(x) == 1 else x[1]
-        if river is None:
-            return {riv.river: self.getSimData(riv.river, reach, rs, prof) for riv in self.rivers}
-        elif reach is None:
-            riv = self.river(river)
-            return {rch.reach: self.getSimData(riv.river, rch.reach, rs, prof) for rch in riv.reaches}
-        elif rs is None:
-            riv = self.river(river)
-            rch = self.reach(river, reach)
-            return {xs.rs: self.getSimData(riv.river, rch.reach, xs.rs, prof) for xs in rch.xses}
-        else:
-            sd = self.getLCRSimData(river, reach, rs, prof)
-            return SimData(
-                mainchan(sd.velocity),
-                max(sd.maxDepth),
-                sum(sd.flow),
-                mainchan(sd.shear),
-                { k: sum(sd.etc[k]) for k in sd.etc }
-                )
+        return self.getResultsArray(None, prof, river, reach, rs).simData(river, reach, rs)
 
     def getLCRSimData(self, river = None, reach = None, rs = None, prof = 1):
         # Similar to above, but retrieves Left, Channel, Right values
         # as a list (in that order) for each parameter.
         # Error values may be Xe+38
-        checkDrop = lambda x: [i for i in x if i < 1e30]
-        wrap0 = lambda x: [0, x[0], 0] if len(x) == 1 else x
-        if river is None:
-            return {riv.river: self.getLCRSimData(riv.river, reach, rs, prof) for riv in self.rivers}
-        elif reach is None:
-            riv = self.river(river)
-            return {rch.reach: self.getLCRSimData(riv.river, rch.reach, rs, prof) for rch in riv.reaches}
-        elif rs is None:
-            riv = self.river(river)
-            rch = self.reach(river, reach)
-            return {xs.rs: self.getLCRSimData(riv.river, rch.reach, xs.rs, prof) for xs in rch.xses}
-        else:
-            riv = self.river(river)
-            rch = riv.reach(reach)
-            xs = rch.xs(rs)
-            sd = self.ras.GetVelDist(xs.riverID, xs.reachID, xs.xsID, 0, prof)
-            # sd: (6x args, (left station), (right station), (conv perc), (area), (wetted perimeter), (flow),
-            # (depth), (velocity))
-            vels = list(sd[-1])
-            depth = list(sd[-2])
-            # 0 or 1; needed to get max chl. depth instead of hydraulic depth
-            depth[int(len(depth)/2)] = self.ras.GetNodeOutput(xs.riverID,
-                                                              xs.reachID,
-                                                              xs.xsID, None,
-                                           prof, 4)[0]
-            flow = list(sd[-3])
-            area = list(sd[-4])
-            wp = list(sd[-5])
-            shear = [
-                self.ras.GetNodeOutput(xs.riverID, xs.reachID, xs.xsID, None,
-                                           prof, 151)[0],
-                self.ras.GetNodeOutput(xs.riverID, xs.reachID, xs.xsID, None,
-                                           prof, 152)[0],
-                self.ras.GetNodeOutput(xs.riverID, xs.reachID, xs.xsID, None,
-                                           prof, 153)[0]
-                ]
-            etc = {
-                "area": wrap0(area),
-                "wp": wrap0(wp)
-            }
-            return SimData(wrap0(vels),
-                           wrap0(depth),
-                           wrap0(flow),
-                           wrap0(checkDrop(shear)),
-                           etc)
-
-class SimData(object):
+        return self.getResultsArray(None, prof, river, reach, rs).lcrSimData(river, reach, rs)
+
+class ManningBatch(object):
     """
-    Simulation data for a cross section.  "etc" is a dictionary of less relevant data.
+    A batch of Manning's n writes (see Ras.batch).  After the batch ends, writes, skipped, and saves give the number
+    of cross sections written, writes skipped as unchanged, and project saves performed.  If the batch exits with
+    an exception, the queued writes are discarded.  A batch opened inside another joins the outer one.
     """
-    def __init__(self, velocity, maxDepth, flow, shear, etc):
-        self.velocity = velocity
-        self.maxDepth = maxDepth
-        self.flow = flow
-        self.shear = shear
-        self.etc = etc
+    def __init__(self, ras):
+        self.ras = ras
+        self.writes = 0
+        self.skipped = 0
+        self.saves = 0
+        self.outer = False
+
+    def __enter__(self):
+        if self.ras.pendingManning is None:
+            self.outer = True
+            self.ras.pendingManning = OrderedDict()
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        if not self.outer:
+            return False
+        pending = self.ras.pendingManning
+        self.ras.pendingManning = None
+        if excType is None:
+            self.commit(pending)
+        return False
+
+    def commit(self, pending):
+        for (river, reach, rs), ns in pending.items():
+            if self.ras.manning.get((river, reach, rs)) == ns:
+                self.skipped += 1
+                self.ras.manningStats["skipped"] += 1
+                continue
+            self.ras.ras.SetMannLCR(river, reach, rs, ns[0], ns[1], ns[2], save = False)
+            self.ras.manning[(river, reach, rs)] = ns
+            self.writes += 1
+            self.ras.manningStats["written"] += 1
+        if self.writes > 0:
+            self.ras.save()
+            self.saves += 1
+            self.ras.manningSaved()
+            self.ras.invalidateResults()
+
 
 class XS(object):
     """
     A cross section.
     """
-    def __init__(self, ras, river, reach, rs):
+    def __init__(self, ras, river, reach, rs, index = None, model = None):
         """
         :param ras: RasObject (from wrapper)
         :param river: river (string)
         :param reach: string
         :param rs: river station (string)
+        :param index: GeometryIndex to look up IDs in; if None, IDs are looked up through the RasObject
+        :param model: the Ras this cross section belongs to, if any, through which Manning's n writes are made
         """
         self.ras = ras
+        self.model = model
         self.river = river
         self.reach = reach
         self.rs = rs
-        self.riverID = getRiverID(self.ras, self.river)
-        self.reachID = getReachID(self.ras, self.river, self.reach)
-        self.xsID = getXSID(self.ras, self.river, self.reach, self.rs)
+        if index is None:
+            self.riverID = getRiverID(self.ras, self.river)
+            self.reachID = getReachID(self.ras, self.river, self.reach)
+            self.xsID = getXSID(self.ras, self.river, self.reach, self.rs)
+        else:
+            self.riverID = index.riverID(self.river)
+            self.reachID = index.reachID(self.river, self.reach)
+            self.xsID = index.xsID(self.river, self.reach, self.rs)
 
     def setAllManning(self, ns):
         """
         Set left, main, right ns.
         :param ns: [left, main, right] Manning's n
         """
-        self.ras.SetMannLCR(self.river, self.reach,  self.rs, ns[0], ns[1], ns[2])
+        self.setMannLCR(ns[0], ns[1], ns[2])
 
     def setMainChannelManning(self, n):
         """
         Set the main channel n.  For now, set left/right ns to be the same; in future, keep them as-is.
         :param n: main channel n.
         """
-        self.ras.SetMannLCR(self.river, self.reach, self.rs, n, n, n)
+        self.setMannLCR(n, n, n)
+
+    def setMannLCR(self, left, channel, right):
+        # Returns whether the n was written (see Ras.setMannLCR)
+        if self.model is not None:
+            return self.model.setMannLCR(self.river, self.reach, self.rs, left, channel, right)
+        self.ras.SetMannLCR(self.river, self.reach, self.rs, left, channel, right)
+        return True
 
     def editSteadyFlow(self):
         self.ras.EditSteadyFlow()
@@ -204,6 +573,31 @@ class XS(object):
         self.ras.setSteadyFlow(self.river, self.reach, self.rs, flows, wait)
 
 
+def samePath(a, b):
+    # Whether two paths refer to the same file; False if either is empty
+    if not a or not b:
+        return False
+    return os.path.normcase(os.path.abspath(a)) == os.path.normcase(os.path.abspath(b))
+
+def fileStamp(path):
+    """
+    :return: (modification time, size) of a file, to detect changes; None if there is no such file
+    """
+    try:
+        st = os.stat(path)
+    except (OSError, TypeError, ValueError):
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+def planTitle(text):
+    """
+    Get the title of a plan from the text of its plan file.
+    """
+    for line in (text or "").split("\n"):
+        if line.startswith("Plan Title="):
+            return line.split("=", 1)[1].strip()
+    raise ValueError("No plan title in plan file")
+
 def getRiverID(ras, river):
     """
     Find river ID from river name
@@ -238,19 +632,37 @@ class Reach(object):
     """
     A reach.
     """
-    def __init__(self, ras, river, reach):
+    def __init__(self, ras, river, reach, index = None, model = None):
         self.ras = ras
         self.river = river
         self.reach = reach
-        self.riverID = getRiverID(self.ras, self.river)
-        self.reachID = getReachID(self.ras, self.river, self.reach)
-        self.xses = [XS(self.ras, self.river, self.reach, rs) for rs in self.getCrossSections()]
+        if index is None:
+            index = GeometryIndex.build(self.ras)
+        self.index = index
+        self.model = model
+        self.riverID = index.riverID(self.river)
+        self.reachID = index.reachID(self.river, self.reach)
+        self.xsList = None
+        self.xsLookup = None
+
+    def loadCrossSections(self):
+        # Cross sections are fetched and created on first access
+        if self.xsList is None:
+            self.xsList = [XS(self.ras, self.river, self.reach, rs, self.index, self.model)
+                           for rs in self.index.stations(self.river, self.reach)]
+            self.xsLookup = {xs.rs: xs for xs in self.xsList}
+
+    @property
+    def xses(self):
+        self.loadCrossSections()
+        return self.xsList
 
     def getCrossSections(self):
         return [xs.strip() for xs in self.ras.GetNodes(self.riverID, self.reachID)[3]]
 
     def xs(self, rs):
-        return [xs for xs in self.xses if xs.rs == rs][0]
+        self.loadCrossSections()
+        return self.xsLookup[rs]
 
     def xsAt(self, rs):
         return self.xs(rs)
@@ -259,15 +671,25 @@ class River(object):
     """
     A river.
     """
-    def __init__(self, ras, river):
+    def __init__(self, ras, river, index = None, model = None):
         self.ras = ras
         self.river = river
-        self.riverID = getRiverID(self.ras, self.river)
-        self.reaches = [Reach(self.ras, self.river, reach) for reach in self.getReaches()]
+        if index is None:
+            index = GeometryIndex.build(self.ras)
+        self.index = index
+        self.model = model
+        self.riverID = index.riverID(self.river)
+        self.reachLookup = {}
+
+    @property
+    def reaches(self):
+        return [self.reach(reach) for reach in self.index.reachNames(self.river)]
 
     def getReaches(self):
         return [r.strip() for r in self.ras.GetReaches(self.riverID)[2]]
 
     def reach(self, reach):
-        return [rch for rch in self.reaches if rch.reach == reach][0]
+        if reach not in self.reachLookup:
+            self.reachLookup[reach] = Reach(self.ras, self.river, reach, self.index, self.model)
+        return self.reachLookup[reach]
 
@@ -0,0 +1,373 @@
+"""
+Dense, array-based simulation results.  Rather than one SimData object per cross section per profile, results are
+held as one float array per variable with shape (profile, xs, 3), the last axis being left overbank, main channel,
+and right overbank (L/C/R).  Nested-dictionary views can be generated from these arrays when needed.
+"""
+
+import numpy as np
+from collections import OrderedDict
+
+# Variables available from a result backend, named as in SimData ("area" and "wp" are in SimData.etc)
+VARIABLES = ["velocity", "maxDepth", "flow", "shear", "area", "wp"]
+
+# Unsteady time series variables: water surface elevation, total flow, and main channel velocity
+TIME_SERIES_VARIABLES = ["wse", "flow", "velocity"]
+
+# HEC-RAS reports missing values as very large numbers (~1e38)
+ERROR_VALUE = 1e30
+
+
+def padLCR(arr, counts):
+    """
+    Vectorized equivalent of wrapping single-value (main channel only) outputs as [0, x, 0].
+    :param arr: (profile, xs, 3) array, with raw values filled from the left
+    :param counts: (profile, xs) array of how many raw values were filled
+    :return: arr, modified in place
+    """
+    single = counts == 1
+    arr[single, 1] = arr[single, 0]
+    arr[single, 0] = 0
+    return arr
+
+
+def dropErrors(arr):
+    """
+    Replace HEC-RAS error values (>= 1e30) with 0, in place.
+    """
+    arr[arr >= ERROR_VALUE] = 0
+    return arr
+
+
+class ResultCache(object):
+    """
+    Bounded least-recently-used cache of results.  hits and misses count lookups.
+    """
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last = False)
+
+    def clear(self):
+        self.entries.clear()
+
+
+class SimData(object):
+    """
+    Simulation data for a cross section.  "etc" is a dictionary of less relevant data.
+    """
+    def __init__(self, velocity, maxDepth, flow, shear, etc):
+        self.velocity = velocity
+        self.maxDepth = maxDepth
+        self.flow = flow
+        self.shear = shear
+        self.etc = etc
+
+
+class ResultArrays(object):
+    """
+    Simulation results for a set of cross sections and profiles.
+    index: list of (river, reach, rs) for each cross section, in model order
+    profiles: list of profile numbers
+    data: {variable: array of shape (profile, xs, 3)}
+    """
+    def __init__(self, index, profiles, data):
+        self.index = index
+        self.profiles = profiles
+        self.data = data
+
+    def __getitem__(self, variable):
+        return self.data[variable]
+
+    def __contains__(self, variable):
+        return variable in self.data
+
+    def variables(self):
+        return list(self.data.keys())
+
+    def nest(self, values, river = None, reach = None, rs = None):
+        """
+        Arrange values (one per cross section, in index order) into the nested dictionaries used by getSimData,
+        i.e. one level for each of river, reach, and rs that was not specified.  If all are specified, return the
+        single value.
+        """
+        levels = [k for k, v in enumerate((river, reach, rs)) if v is None]
+        if len(levels) == 0:
+            return values[0]
+        result = {}
+        for key, value in zip(self.index, values):
+            d = result
+            for k in levels[:-1]:
+                d = d.setdefault(key[k], {})
+            d[key[levels[-1]]] = value
+        return result
+
+    def nestProfiles(self, values, river = None, reach = None, rs = None):
+        """
+        As nest, but for values of shape (profile, xs, ...).  If there is more than one profile, the result has an
+        outer {profile: ...} level, as with DataAPI.allFlow.
+        """
+        if len(self.profiles) == 1:
+            return self.nest(values[0].tolist(), river, reach, rs)
+        return {p: self.nest(values[i].tolist(), river, reach, rs) for i, p in enumerate(self.profiles)}
+
+    def __len__(self):
+        # Number of records, i.e. (profile, xs) pairs
+        return len(self.profiles) * len(self.index)
+
+    def profileIndex(self, prof = None):
+        # Position of profile number prof in the arrays; the first profile if None
+        return 0 if prof is None else self.profiles.index(prof)
+
+    def reachSlice(self, river, reach):
+        """
+        :return: slice of the cross sections of the given reach.  Cross sections are in model order, so each reach
+            is contiguous.
+        """
+        positions = [j for j, key in enumerate(self.index) if key[0] == river and key[1] == reach]
+        if len(positions) == 0:
+            raise KeyError((river, reach))
+        return slice(positions[0], positions[-1] + 1)
+
+    def reach(self, river, reach):
+        """
+        Results for one reach.  The arrays are views of these arrays, not copies.
+        """
+        sl = self.reachSlice(river, reach)
+        return ResultArrays(self.index[sl], self.profiles, {k: v[:, sl] for k, v in self.data.items()})
+
+    def profile(self, prof):
+        """
+        Results for one profile (by profile number).  The arrays are views of these arrays, not copies.
+        """
+        i = self.profileIndex(prof)
+        return ResultArrays(self.index, [prof], {k: v[i:i + 1] for k, v in self.data.items()})
+
+    def record(self, river, reach, rs, prof = None, lcr = True):
+        """
+        SimRecord for one cross section and profile (the first profile if None).
+        """
+        return SimRecord(self, self.profileIndex(prof), self.index.index((river, reach, rs)), lcr)
+
+    def toColumns(self):
+        """
+        Flat columns, one row per (profile, xs) pair in profile-major order: "river", "reach", "rs", and "profile",
+        then "<variable>_L", "<variable>_C", and "<variable>_R" for each variable.  Value columns are views of the
+        arrays where possible.
+        :return: {column: 1-D array}
+        """
+        nprof = len(self.profiles)
+        columns = OrderedDict()
+        for k, name in enumerate(["river", "reach", "rs"]):
+            columns[name] = np.tile(np.array([key[k] for key in self.index], dtype = object), nprof)
+        columns["profile"] = np.repeat(np.array(self.profiles), len(self.index))
+        for variable, arr in self.data.items():
+            flat = arr.reshape(-1, 3)
+            for k, side in enumerate("LCR"):
+                columns["%s_%s" % (variable, side)] = flat[:, k]
+        return columns
+
+    def toPandas(self):
+        """
+        Results as a pandas DataFrame, with the columns of toColumns.  Requires pandas.
+        """
+        import pandas
+        return pandas.DataFrame(self.toColumns())
+
+    def toArrow(self):
+        """
+        Results as a pyarrow Table, with the columns of toColumns.  Requires pyarrow.
+        """
+        import pyarrow
+        columns = self.toColumns()
+        return pyarrow.table([pyarrow.array(col) for col in columns.values()], names = list(columns.keys()))
+
+    def simData(self, river = None, reach = None, rs = None, prof = None):
+        """
+        Nested records of main channel/total values for one profile (by default the first), as returned by
+        getSimData.  Each record is a SimRecord view of these arrays.
+        """
+        i = self.profileIndex(prof)
+        return self.nest([SimRecord(self, i, j, False) for j in range(len(self.index))], river, reach, rs)
+
+    def lcrSimData(self, river = None, reach = None, rs = None, prof = None):
+        """
+        Nested records of [left, channel, right] values for one profile (by default the first), as returned by
+        getLCRSimData.  Each record is a SimRecord view of these arrays.
+        """
+        i = self.profileIndex(prof)
+        return self.nest([SimRecord(self, i, j, True) for j in range(len(self.index))], river, reach, rs)
+
+
+class SimRecord(object):
+    """
+    A view of the results for one cross section and profile of a ResultArrays, with the same attributes as SimData.
+    If lcr, values are [left, channel, right] lists; otherwise they are main channel values (velocity, shear), sums
+    (flow, area, wp), or the maximum (maxDepth).  Values are read from the arrays on access.
+    """
+    __slots__ = ("results", "i", "j", "lcr")
+
+    def __init__(self, results, i, j, lcr = True):
+        self.results = results
+        self.i = i
+        self.j = j
+        self.lcr = lcr
+
+    def get(self, variable):
+        values = self.results[variable][self.i, self.j]
+        if self.lcr:
+            return values.tolist()
+        if variable in ("flow", "area", "wp"):
+            return float(values.sum())
+        if variable == "maxDepth":
+            return float(values.max())
+        return float(values[1])
+
+    @property
+    def velocity(self):
+        return self.get("velocity")
+
+    @property
+    def maxDepth(self):
+        return self.get("maxDepth")
+
+    @property
+    def flow(self):
+        return self.get("flow")
+
+    @property
+    def shear(self):
+        return self.get("shear")
+
+    @property
+    def etc(self):
+        return {"area": self.get("area"), "wp": self.get("wp")}
+
+    def toSimData(self):
+        return SimData(self.velocity, self.maxDepth, self.flow, self.shear, self.etc)
+
+
+class RatingCurve(object):
+    """
+    A rating curve at one cross section: main channel stage (maximum depth, as DataAPI.stage), velocity, and shear
+    for a set of flows, as arrays sorted by flow.
+    """
+    def __init__(self, river, reach, rs, flows, stage, velocity, shear):
+        order = np.argsort(flows, kind = "stable")
+        self.river = river
+        self.reach = reach
+        self.rs = rs
+        self.flows = np.asarray(flows, dtype = float)[order]
+        self.stage = np.asarray(stage, dtype = float)[order]
+        self.velocity = np.asarray(velocity, dtype = float)[order]
+        self.shear = np.asarray(shear, dtype = float)[order]
+
+    def __len__(self):
+        return len(self.flows)
+
+    def isMonotone(self):
+        # Whether stage never decreases as flow increases
+        return bool(np.all(np.diff(self.stage) >= 0))
+
+    def stageAt(self, flow):
+        """
+        Stage at the given flow(s), by linear interpolation between the computed flows (clamped at the ends).
+        """
+        return np.interp(flow, self.flows, self.stage)
+
+    def velocityAt(self, flow):
+        return np.interp(flow, self.flows, self.velocity)
+
+    def shearAt(self, flow):
+        return np.interp(flow, self.flows, self.shear)
+
+    def flowAt(self, stage):
+        """
+        Flow at the given stage(s), by linear interpolation.  Stage is made monotone (its running maximum over
+        increasing flow) so that the inverse is well defined.
+        """
+        monotone = np.maximum.accumulate(self.stage)
+        # Of equal stages, use the first (lowest) flow
+        keep = np.concatenate([[True], np.diff(monotone) > 0])
+        return np.interp(stage, monotone[keep], self.flows[keep])
+
+    def toColumns(self):
+        return OrderedDict([("flow", self.flows), ("stage", self.stage), ("velocity", self.velocity),
+                            ("shear", self.shear)])
+
+
+class TimeSeries(object):
+    """
+    Unsteady results for a set of cross sections over a window of output time steps.
+    index: list of (river, reach, rs) for each cross section, as in ResultArrays
+    steps: array of output time step numbers (0-based, counting from the start of the run's output)
+    times: list of the output times, as labelled by HEC-RAS (e.g. "01JAN2000 01:00:00")
+    data: {variable: array of shape (time, xs)}, variables being from TIME_SERIES_VARIABLES
+    """
+    def __init__(self, index, steps, times, data):
+        self.index = index
+        self.steps = np.asarray(steps, dtype = int)
+        self.times = times
+        self.data = data
+
+    def __getitem__(self, variable):
+        return self.data[variable]
+
+    def __contains__(self, variable):
+        return variable in self.data
+
+    def __len__(self):
+        return len(self.steps)
+
+    def variables(self):
+        return list(self.data.keys())
+
+    def series(self, river, reach, rs):
+        """
+        The time series of one cross section, as {variable: 1-D array} (views of these arrays).
+        """
+        j = self.index.index((river, reach, rs))
+        return {k: v[:, j] for k, v in self.data.items()}
+
+    @classmethod
+    def concat(cls, parts):
+        """
+        Join consecutive windows (with the same cross sections and variables) into one.
+        """
+        parts = list(parts)
+        if len(parts) == 0:
+            raise ValueError("No time series to join")
+        data = {k: np.concatenate([part[k] for part in parts]) for k in parts[0].variables()}
+        return cls(parts[0].index, np.concatenate([part.steps for part in parts]),
+                   [t for part in parts for t in part.times], data)
+
+
+def joinTimeSeries(parts, variables, index):
+    """
+    Join TimeSeries chunks (e.g. from iterTimeSeries) into one, which is empty if there are no chunks.
+    """
+    parts = list(parts)
+    if len(parts) > 0:
+        return TimeSeries.concat(parts)
+    variables = TIME_SERIES_VARIABLES if variables is None else list(variables)
+    return TimeSeries(index, [], [], {v: np.zeros((0, len(index))) for v in variables})
@@ -0,0 +1,166 @@
+"""
+A local store of computed results, keyed by the content of the scenario that produced them, so that a scenario that
+has been run before (in this process or another, e.g. a resumed batch run) does not need to be computed again:
+
+    store = ResultStore("results.sqlite")
+    api = API(ras, store = store)
+    for ns in candidates:
+        api.params.modifyN(ns, river, reach)
+        results = api.data.computeResults(["velocity", "maxDepth"], range(1, 11))
+
+The key (scenarioKey) is a hash of the geometry file, the Manning's n applied to each cross section, the flow file,
+and the plan file, together with what was read.  Results are stored in SQLite (in WAL mode, so several worker
+processes can share a store) as compressed array blobs, and the least recently used are evicted once the store
+exceeds its size limit.
+"""
+
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import time
+from contextlib import closing
+
+import numpy as np
+
+from raspy_auto.ras.index import fileHash
+from raspy_auto.ras.results import ResultArrays
+
+
+def planFiles(ras):
+    """
+    The files of the current plan.
+    :return: (plan file, geometry file, flow file); the flow file is None if the plan names none
+    """
+    planPath = ras.currentPlanFile()
+    base = os.path.splitext(planPath)[0]
+    flowPath = None
+    with open(planPath) as f:
+        for line in f:
+            if line.startswith("Flow File="):
+                flowPath = "%s.%s" % (base, line.split("=", 1)[1].strip())
+    return planPath, ras.currentGeomFile(), flowPath
+
+
+def scenarioKey(ras, extra = None):
+    """
+    Content hash of the current scenario: the geometry, flow, and plan files, and the Manning's n applied to each
+    cross section through ras (including writes still queued in a batch).  The geometry file already reflects n
+    that has been saved; the applied n also covers n not (yet) saved.
+    :param extra: optional JSON-serializable value also distinguishing the results, e.g. what is read
+    :return: hex digest
+    """
+    planPath, geomPath, flowPath = planFiles(ras)
+    manning = dict(ras.manning)
+    if ras.pendingManning is not None:
+        manning.update(ras.pendingManning)
+    h = hashlib.sha256()
+    for path in [geomPath, flowPath, planPath]:
+        h.update((fileHash(path) if path is not None and os.path.isfile(path) else "-").encode())
+    h.update(json.dumps(sorted([list(k), [float(n) for n in v]] for k, v in manning.items())).encode())
+    h.update(json.dumps(extra).encode())
+    return h.hexdigest()
+
+
+def packResults(results):
+    # ResultArrays to (metadata JSON, array blob)
+    meta = json.dumps({"index": [list(key) for key in results.index], "profiles": list(results.profiles),
+                       "variables": results.variables()})
+    buf = io.BytesIO()
+    np.savez_compressed(buf, *[results[v] for v in results.variables()])
+    return meta, buf.getvalue()
+
+
+def unpackResults(meta, blob):
+    meta = json.loads(meta)
+    with np.load(io.BytesIO(blob)) as arrays:
+        data = {v: arrays["arr_%d" % k] for k, v in enumerate(meta["variables"])}
+    return ResultArrays([tuple(key) for key in meta["index"]], meta["profiles"], data)
+
+
+class ResultStore(object):
+    """
+    Results (ResultArrays) by scenario key, in an SQLite database.  Each operation uses its own connection, so a
+    store can be used from several threads and processes at once; concurrent writers wait up to timeout seconds for
+    each other.  stats counts hits, misses, puts, and evictions.
+    """
+    def __init__(self, path, maxBytes = 1 << 30, timeout = 60.0):
+        """
+        :param path: database file, created if it does not exist
+        :param maxBytes: size limit of the stored arrays; the least recently used results are evicted beyond it
+        :param timeout: seconds to wait for another process's write to finish
+        """
+        self.path = path
+        self.maxBytes = maxBytes
+        self.timeout = timeout
+        self.stats = {"hits": 0, "misses": 0, "puts": 0, "evicted": 0}
+        with closing(self.connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, meta TEXT NOT NULL, "
+                         "data BLOB NOT NULL, size INTEGER NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)")
+
+    def connect(self):
+        # Autocommit mode, with explicit transactions for writes
+        return sqlite3.connect(self.path, timeout = self.timeout, isolation_level = None)
+
+    def get(self, key):
+        """
+        :return: the ResultArrays stored under key, or None
+        """
+        with closing(self.connect()) as conn:
+            row = conn.execute("SELECT meta, data FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            conn.execute("UPDATE results SET accessed = ? WHERE key = ?", (time.time(), key))
+        self.stats["hits"] += 1
+        return unpackResults(*row)
+
+    def __contains__(self, key):
+        with closing(self.connect()) as conn:
+            return conn.execute("SELECT 1 FROM results WHERE key = ?", (key,)).fetchone() is not None
+
+    def put(self, key, results):
+        """
+        Store results (ResultArrays) under key, replacing any already there, then evict the least recently used
+        results until the store is within maxBytes.
+        """
+        meta, blob = packResults(results)
+        now = time.time()
+        with closing(self.connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+                             (key, meta, sqlite3.Binary(blob), len(blob), now, now))
+                self.evict(conn, key)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        self.stats["puts"] += 1
+
+    def evict(self, conn, keep):
+        # Within a write transaction: delete the least recently used results (other than keep) beyond maxBytes
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.maxBytes:
+            return
+        rows = conn.execute("SELECT key, size FROM results WHERE key != ? ORDER BY accessed", (keep,)).fetchall()
+        for key, size in rows:
+            if total <= self.maxBytes:
+                break
+            conn.execute("DELETE FROM results WHERE key = ?", (key,))
+            total -= size
+            self.stats["evicted"] += 1
+
+    def size(self):
+        """
+        :return: (number of stored results, total bytes of their arrays)
+        """
+        with closing(self.connect()) as conn:
+            return tuple(conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone())
+
+    def clear(self):
+        with closing(self.connect()) as conn:
+            conn.execute("DELETE FROM results")
@@ -0,0 +1,248 @@
+"""
+Record-and-replay of HEC-RAS controller traces.  A RecordingController wraps a real controller and writes every COM
+call (method, arguments, return value or error, and latency) to a trace file, one JSON object per line (gzipped if
+the path ends in .gz).  A ReplayController serves a trace back, so a real workload can be rerun and benchmarked
+without HEC-RAS (or Windows), with its real call results and, optionally, its real latencies:
+
+    recorder = RecordingController("calibration.trace.gz")  # starts HEC-RAS
+    ras = Ras(projectPath, rasObject = RasObject(ras = recorder))
+    ...
+    recorder.close()
+
+    replay = ReplayController("calibration.trace.gz")
+    ras = Ras(projectPath, rasObject = RasObject(ras = replay))
+
+By default, replay looks calls up by method and arguments, serving the recorded results for each in the order they
+were recorded (repeating the last once they run out), so code that makes fewer, more, or reordered calls than the
+recorded run can still be replayed.  With strict = True, calls must instead match the trace exactly, in order.
+
+A trace is self-contained, so it can be replayed on another machine without the project files: while recording or
+replaying, Ras does not use its on-disk topology cache (so the topology comes from recorded calls), and the project
+files Ras reads and writes (plan and flow files, e.g. in ParamsAPI.setSteadyFlows and Ras.reloadFlow) go through the
+controller's ReadFile and WriteFile, which are recorded like COM calls.  Replay checks that the same files are
+written with the same contents.  Operations that read project files directly are not replayable elsewhere:
+ParamsAPI.modifyNFile and geometry.GeometryFile, ResultReader and readBatch, and DataAPI.computeResults with a
+ResultStore (whose keys hash the project files).  Calls missing from a trace raise TraceMismatch.
+"""
+
+import gzip
+import json
+import threading
+import time
+from collections import Counter
+
+TRACE_FORMAT = "raspy-trace"
+TRACE_VERSION = 1
+
+
+def readLocalFile(path):
+    """
+    :return: the text of a file, or None if it does not exist
+    """
+    try:
+        with open(path) as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def writeLocalFile(path, text):
+    with open(path, "w") as f:
+        f.write(text)
+
+
+def openTrace(path, mode):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding = "utf-8")
+    return open(path, mode, encoding = "utf-8")
+
+
+def encodeValue(value):
+    # JSON encoding of values JSON doesn't know, e.g. numpy scalars and arrays
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    return str(value)
+
+
+def decodeValue(value):
+    # COM returns tuples, which JSON stores as arrays
+    if isinstance(value, list):
+        return tuple(decodeValue(v) for v in value)
+    return value
+
+
+def callKey(method, args):
+    return method + json.dumps(args, default = encodeValue, separators = (",", ":"))
+
+
+def readTrace(path):
+    """
+    Generate the calls of a trace file, as dictionaries: "m" (method), "a" (arguments), "r" (return value) or "e"
+    (error message), and "t" (seconds).  Reads of properties (e.g. SteadyFlow_nProfile) also have "p": 1.
+    """
+    with openTrace(path, "r") as f:
+        header = json.loads(f.readline())
+        if header.get("format") != TRACE_FORMAT:
+            raise ValueError("%s is not a raspy trace" % path)
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class TraceMismatch(Exception):
+    pass
+
+
+class RecordedError(Exception):
+    """
+    An error raised by the recorded controller, raised again on replay.
+    """
+    pass
+
+
+class RecordingController(object):
+    """
+    Wraps a HEC-RAS controller, recording every method call, and the project files read and written through it, to
+    a trace file.  calls counts the calls by method.
+    """
+    traced = True
+
+    def __init__(self, path, controller = None, rasName = "RAS507.HECRASController"):
+        """
+        :param path: trace file to write (replaced if it exists)
+        :param controller: controller to record; by default, a new HEC-RAS controller of the given name
+        """
+        if controller is None:
+            from win32com import client
+            controller = client.Dispatch(rasName)
+        self.controller = controller
+        self.path = path
+        self.calls = Counter()
+        self.lock = threading.Lock()
+        self.file = openTrace(path, "w")
+        self.file.write(json.dumps({"format": TRACE_FORMAT, "version": TRACE_VERSION, "created": time.time()}) + "\n")
+
+    def write(self, entry):
+        line = json.dumps(entry, default = encodeValue, separators = (",", ":"))
+        with self.lock:
+            self.calls[entry["m"]] += 1
+            if self.file is not None:
+                self.file.write(line + "\n")
+
+    def call(self, name, func, args, prop = False):
+        start = time.perf_counter()
+        try:
+            result = func(*args)
+        except Exception as e:
+            self.write({"m": name, "a": args, "e": str(e), "t": time.perf_counter() - start})
+            raise
+        entry = {"m": name, "a": args, "r": result, "t": time.perf_counter() - start}
+        if prop:
+            entry["p"] = 1
+        self.write(entry)
+        return result
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        start = time.perf_counter()
+        attr = getattr(self.controller, name)
+        if not callable(attr):
+            # A property read
+            self.write({"m": name, "a": [], "r": attr, "t": time.perf_counter() - start, "p": 1})
+            return attr
+        return lambda *args: self.call(name, attr, args)
+
+    def ReadFile(self, path):
+        return self.call("ReadFile", readLocalFile, (path,))
+
+    def WriteFile(self, path, text):
+        return self.call("WriteFile", writeLocalFile, (path, text))
+
+    def close(self):
+        """
+        Finish writing the trace.  The controller itself is left running.
+        """
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class ReplayController(object):
+    """
+    Serves the calls of a trace file in place of a HEC-RAS controller.  calls counts the calls served by method, as
+    for ras.fake.FakeController, so it can be benchmarked the same way.  Project files are read from the trace, and
+    never written.
+    """
+    traced = True
+
+    def __init__(self, path, strict = False, latency = 0.0):
+        """
+        :param path: trace file, as written by RecordingController
+        :param strict: whether calls must match the trace exactly, in order, rather than being looked up by method
+            and arguments
+        :param latency: multiple of the recorded latency to wait on each call (1.0 to replay real timings)
+        :raises TraceMismatch: from a call not in the trace (or, if strict, not the next call in it)
+        """
+        self.path = path
+        self.strict = strict
+        self.latency = latency
+        self.calls = Counter()
+        self.entries = list(readTrace(path))
+        self.position = 0
+        # Recorded entries by call, and the number served so far of each
+        self.byCall = {}
+        for entry in self.entries:
+            self.byCall.setdefault(callKey(entry["m"], entry["a"]), []).append(entry)
+        self.properties = set(entry["m"] for entry in self.entries if "p" in entry)
+        self.served = Counter()
+
+    def next(self, method, args):
+        key = callKey(method, args)
+        if self.strict:
+            if self.position >= len(self.entries):
+                raise TraceMismatch("%s%r called after the end of the trace" % (method, args))
+            entry = self.entries[self.position]
+            if callKey(entry["m"], entry["a"]) != key:
+                raise TraceMismatch("Call %d: expected %s%r, got %s%r" % (self.position + 1, entry["m"],
+                                                                          tuple(entry["a"]), method, args))
+            self.position += 1
+            return entry
+        if key not in self.byCall:
+            raise TraceMismatch("%s%r is not in the trace" % (method, args))
+        entries = self.byCall[key]
+        entry = entries[min(self.served[key], len(entries) - 1)]
+        self.served[key] += 1
+        return entry
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+
+        def replayed(*args):
+            self.calls[name] += 1
+            entry = self.next(name, args)
+            if self.latency > 0:
+                time.sleep(self.latency * entry["t"])
+            if "e" in entry:
+                raise RecordedError(entry["e"])
+            return decodeValue(entry["r"])
+        if name in self.properties:
+            return replayed()
+        return replayed
+
+    def recordedSeconds(self):
+        """
+        :return: {method: total recorded seconds} over the whole trace
+        """
+        totals = Counter()
+        for entry in self.entries:
+            totals[entry["m"]] += entry["t"]
+        return dict(totals)
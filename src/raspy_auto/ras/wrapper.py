@@ -24,16 +24,59 @@ Geometry_SetMann(string River, string Reach, string RS, int nMann, Single[] Mann
 Geometry_SetMann_LChR(string River, string Reach, string RS, Single MannLOB, Single MannChan, Single MannROB, string errmsg)
 """
 
-from win32com import client
+from raspy_auto.ras.instrument import Instrumentation, InstrumentedController
+from raspy_auto.ras.trace import readLocalFile, writeLocalFile
 
 
 class RasObject(object):
     def __init__(self, rasName = "RAS507.HECRASController", ras=None):
         # By default, initialize a new RAS controller object; otherwise, use the provided one.
         if ras is None:
+            # Imported here so that RasObject can wrap other controllers (e.g. ras.fake) without pywin32
+            from win32com import client
             self.ras = client.Dispatch(rasName)
         else:
             self.ras = ras
+        self.instrumentation = None
+
+    def enableInstrumentation(self, instrumentation = None):
+        """
+        Start recording COM call statistics (see instrument.py).
+        :param instrumentation: Instrumentation to record into; by default, a new one
+        :return: the Instrumentation
+        """
+        if self.instrumentation is None:
+            self.instrumentation = Instrumentation() if instrumentation is None else instrumentation
+            self.ras = InstrumentedController(self.ras, self.instrumentation)
+        return self.instrumentation
+
+    def disableInstrumentation(self):
+        # Stop recording, going back to calling the controller directly
+        if self.instrumentation is not None:
+            self.ras = self.ras.controller
+            self.instrumentation = None
+
+    @property
+    def traced(self):
+        # Whether the controller's calls are being recorded or replayed (see trace.py)
+        return getattr(self.ras, "traced", False)
+
+    def ReadFile(self, path):
+        """
+        Read a project file.  A recording or replaying controller (trace.py) handles this itself, so that project
+        files are part of the trace.
+        :return: the file's text, or None if it does not exist
+        """
+        if self.traced:
+            return self.ras.ReadFile(path)
+        return readLocalFile(path)
+
+    def WriteFile(self, path, text):
+        # Write a project file, as ReadFile
+        if self.traced:
+            self.ras.WriteFile(path, text)
+        else:
+            writeLocalFile(path, text)
 
     def ShowRas(self):
         # Show HEC-RAS window
@@ -45,6 +88,21 @@ class RasObject(object):
     def CurrentProject(self):
         return self.ras.Project_Current()
 
+    def CurrentGeomFile(self):
+        # Path to the active geometry file
+        return self.ras.CurrentGeomFile()
+
+    def CurrentPlanFile(self):
+        # Path to the active plan file
+        return self.ras.CurrentPlanFile()
+
+    def SetPlan(self, plan):
+        """
+        Make the plan with the given title the current plan.
+        :return: whether the plan was set
+        """
+        return self.ras.Plan_SetCurrent(plan)
+
     def OpenProject(self, path):
         # Open a project at the given path
         self.ras.Project_Open(path)
@@ -95,6 +153,14 @@ class RasObject(object):
         """
         return self.ras.Output_VelDist(riv, rch, n, updn, prof)
 
+    def GetProfiles(self):
+        """
+        Get the output profiles of the current plan: steady flow profiles, or for unsteady flow, "Max WS" followed
+        by the output time steps.
+        :return: (n. profiles, (profile names))
+        """
+        return self.ras.Output_GetProfiles()
+
     def GetVariables(self):
         """
         Get a list of output variables.
@@ -102,17 +168,23 @@ class RasObject(object):
         """
         return self.ras.Output_Variables()
 
-    def Compute(self):
+    def Compute(self, blocking = True):
         """
         Run the current plan.
+        :param blocking: whether to return only once the run has finished (HEC-RAS's default BlockingMode); if
+            False, return once it has started, and check Complete() for when it finishes
         :return: (some bool, nmsg, (messages), blockingmode)
         """
-        return self.ras.Compute_CurrentPlan()
+        # Compute_CurrentPlan(nmsg, Msg(), BlockingMode); nmsg and Msg are returned
+        return self.ras.Compute_CurrentPlan(None, None, blocking)
 
     def Complete(self):
         return self.ras.Compute_Complete()
 
-    def SetMannLCR(self, river, reach, rs, left, channel, right):
+    def CancelCompute(self):
+        return self.ras.Compute_Cancel()
+
+    def SetMannLCR(self, river, reach, rs, left, channel, right, save = True):
         # Geometry_SetMann_LChR(string River, string Reach, string RS, Single MannLOB, Single MannChan, Single MannROB, string errmsg)
         """
         Set the Manning's n for left, main channel, right.
@@ -122,13 +194,15 @@ class RasObject(object):
         :param left: left bank Manning's n
         :param right: right bank Manning's n
         :param channel: main channel Manning's n
+        :param save: whether to save the project afterwards; batched writes save once at the end instead
         :return: (arguments, errmsg)
         """
         result = self.ras.Geometry_SetMann_LChR(river, reach, rs, left, channel, right)
-        self.ras.Project_Save()
+        if save:
+            self.ras.Project_Save()
         return result
 
-    def SetMann(self, river, reach, rs, manns):
+    def SetMann(self, river, reach, rs, manns, save = True):
         # Geometry_SetMann(string River, string Reach, string RS, int nMann, Single[] Mann_n, Single[] station, string errmsg)
         """
         Set all Manning's n at various stations.
@@ -137,16 +211,22 @@ class RasObject(object):
         :param rs: river station (string)
         :param manns: Manning's ns
         :param stations: stations (from the left)
+        :param save: whether to save the project afterwards
         :return: (arguments, errmsg)
         """
         nMann = len(manns)
         result = self.ras.Geometry_SetMann(river, reach, rs, nMann, manns)
-        self.ras.Project_Save()
+        if save:
+            self.ras.Project_Save()
         return result
 
     def QuitRas(self):
         self.ras.QuitRas()
 
+    def SteadyProfileCount(self):
+        # Number of profiles in the steady flow data HEC-RAS has loaded
+        return self.ras.SteadyFlow_nProfile
+
     def EditSteadyFlow(self):
         self.ras.Edit_SteadyFlowData()
 
@@ -0,0 +1,88 @@
+"""
+Tests of raspy_auto.ras.geometry against sample geometry file text, so they run without HEC-RAS.
+"""
+
+from raspy_auto.ras.geometry import GeometryFile
+
+SAMPLE = """Geom Title=Sample
+Program Version=5.07
+River Reach=RiverOne        ,Lower
+Type RM Length L Ch R = 1 ,2000    ,100,100,100
+#Sta/Elev= 4
+       0     110      50     100     150     100     200     110
+#Mann= 5 , 0 , 0
+       0     .06       0      40     .05       0      60    .035       0
+     140     .03       0     170     .07       0
+Bank Sta=50,150
+Type RM Length L Ch R = 3 ,1500    ,50,50,50
+BEGIN DESCRIPTION:
+A bridge
+END DESCRIPTION:
+#Mann= 3 , 0 , 0
+       0     .08       0      50     .04       0     150     .08       0
+Type RM Length L Ch R = 1 ,1000    ,0,0,0
+#Mann= 3 , 0 , 0
+       0     .06       0      50    .035       0     150     .06       0
+"""
+
+
+def writeSample(tmp_path, newline = "\n"):
+    path = tmp_path / "sample.g01"
+    path.write_bytes(SAMPLE.replace("\n", newline).encode())
+    return str(path)
+
+
+def test_indexes_cross_sections_and_skips_bridges(tmp_path):
+    geom = GeometryFile(writeSample(tmp_path))
+    assert sorted(geom.crossSections()) == [("RiverOne", "Lower", "1000"), ("RiverOne", "Lower", "2000")]
+
+
+def test_reads_multiline_mann_block(tmp_path):
+    geom = GeometryFile(writeSample(tmp_path))
+    assert geom.getMann("RiverOne", "Lower", "2000") == [(0.0, 0.06), (40.0, 0.05), (60.0, 0.035), (140.0, 0.03),
+                                                         (170.0, 0.07)]
+
+
+def test_assigns_entries_by_bank_stations(tmp_path):
+    path = writeSample(tmp_path)
+    geom = GeometryFile(path)
+    assert geom.setMannLCR("RiverOne", "Lower", "2000", 0.1, 0.02, 0.3)
+    geom.write()
+    assert GeometryFile(path).getMann("RiverOne", "Lower", "2000") == [(0.0, 0.1), (40.0, 0.1), (60.0, 0.02),
+                                                                       (140.0, 0.02), (170.0, 0.3)]
+
+
+def test_writes_only_changed_blocks(tmp_path):
+    path = writeSample(tmp_path)
+    geom = GeometryFile(path)
+    assert not geom.setMannLCR("RiverOne", "Lower", "1000", 0.06, 0.035, 0.06)
+    assert not geom.changed()
+    geom.setMannLCR("RiverOne", "Lower", "1000", 0.06, 0.04, 0.06)
+    geom.write()
+    expected = SAMPLE.replace("       0     .06       0      50    .035       0     150     .06       0",
+                              "       0     .06       0      50     .04       0     150     .06       0")
+    with open(path, newline = "") as f:
+        assert f.read() == expected
+
+
+def test_leaves_bridge_roughness_alone(tmp_path):
+    path = writeSample(tmp_path)
+    geom = GeometryFile(path)
+    for key in geom.crossSections():
+        geom.setMannLCR(key[0], key[1], key[2], 0.09, 0.09, 0.09)
+    geom.write()
+    with open(path, newline = "") as f:
+        assert "       0     .08       0      50     .04       0     150     .08       0\n" in f.read()
+
+
+def test_preserves_crlf_line_endings(tmp_path):
+    path = writeSample(tmp_path, "\r\n")
+    geom = GeometryFile(path)
+    assert geom.getMann("RiverOne", "Lower", "2000")[3] == (140.0, 0.03)
+    geom.setMannLCR("RiverOne", "Lower", "2000", 0.1, 0.02, 0.3)
+    geom.write()
+    with open(path, "rb") as f:
+        data = f.read()
+    assert data.count(b"\r\n") == SAMPLE.count("\n")
+    assert b"\n" not in data.replace(b"\r\n", b"")
+    assert GeometryFile(path).getMann("RiverOne", "Lower", "2000")[4] == (170.0, 0.3)
@@ -0,0 +1,116 @@
+"""
+Tests of raspy_auto.ras.hdf against a tiny synthetic plan output file, built with h5py.
+"""
+
+import numpy as np
+import pytest
+
+h5py = pytest.importorskip("h5py")
+
+from raspy_auto.api.api import API
+from raspy_auto.ras.hdf import ResultReader, STEADY_PATH, UNSTEADY_PATH
+
+KEYS = [("A", "Up", "300"), ("A", "Up", "200"), ("A", "Dn", "100")]
+PROFILES = 4
+STEPS = 10
+ERROR = 1e38
+
+
+@pytest.fixture
+def planOutput(tmp_path):
+    """
+    A plan output file with 3 cross sections (inverts 10, 11, 12), 4 steady profiles, and 10 unsteady time steps.
+    Values encode their position, e.g. channel velocity of profile p at cross section j is p + j / 10.
+    """
+    path = str(tmp_path / "sample.p01.hdf")
+    n = len(KEYS)
+    prof = np.arange(1, PROFILES + 1)[:, None]
+    xs = np.arange(n)[None, :]
+    with h5py.File(path, "w") as f:
+        dt = np.dtype([("River", "S16"), ("Reach", "S16"), ("RS", "S8")])
+        # Padded, as HEC-RAS writes them
+        f["Geometry/Cross Sections/Attributes"] = np.array(
+            [tuple(k.encode() + b"  " for k in key) for key in KEYS], dtype = dt)
+        f["Geometry/Cross Sections/Station Elevation Info"] = np.array([[3 * j, 3] for j in range(n)])
+        f["Geometry/Cross Sections/Station Elevation Values"] = np.array(
+            [[s, 10 + j + (s / 100.0 if s != 50 else 0)] for j in range(n) for s in (0, 50, 100)])
+        steady = f.create_group(STEADY_PATH)
+        steady["Profile Names"] = np.array([b"PF %d" % p for p in range(1, PROFILES + 1)])
+        cs = steady.create_group("Cross Sections")
+        cs["Water Surface"] = 15.0 + prof + xs
+        cs["Velocity Channel"] = prof + xs / 10.0
+        cs["Additional Variables/Velocity Left OB"] = prof / 10.0 + xs / 100.0
+        right = np.full((PROFILES, n), 0.5)
+        right[1, 2] = ERROR
+        cs["Velocity Right OB"] = right
+        unsteady = f.create_group(UNSTEADY_PATH)
+        unsteady["Time Date Stamp"] = np.array([b"01JAN2000 %02d00" % t for t in range(STEPS)])
+        ucs = unsteady.create_group("Cross Sections")
+        t = np.arange(STEPS)[:, None]
+        ucs["Water Surface"] = 100.0 + t + xs / 10.0
+        ucs["Flow"] = 1000.0 * (t + 1) + xs
+        velocity = 1.0 + t / 10.0 + 0.0 * xs
+        velocity[4, 1] = ERROR
+        ucs["Velocity Channel"] = velocity
+    return path
+
+
+def test_index_strips_padding(planOutput):
+    with ResultReader(planOutput) as reader:
+        assert reader.index == KEYS
+        assert reader.reachKeys() == [("A", "Up"), ("A", "Dn")]
+        assert reader.profileNames() == ["PF 1", "PF 2", "PF 3", "PF 4"]
+
+
+def test_results_array(planOutput):
+    with ResultReader(planOutput) as reader:
+        res = reader.getResultsArray(["velocity", "maxDepth"], [1, 2], "A", "Up")
+        assert res.index == KEYS[:2]
+        assert res["velocity"].shape == (2, 2, 3)
+        np.testing.assert_allclose(res["velocity"][:, :, 1], [[1.0, 1.1], [2.0, 2.1]])
+        np.testing.assert_allclose(res["velocity"][:, :, 0], [[0.1, 0.11], [0.2, 0.21]])
+        # Channel max depth is water surface minus invert; missing overbank datasets read as 0
+        np.testing.assert_allclose(res["maxDepth"][:, :, 1], [[6.0, 6.0], [7.0, 7.0]])
+        assert not res["maxDepth"][:, :, [0, 2]].any()
+
+
+def test_missing_channel_output(planOutput):
+    with ResultReader(planOutput) as reader:
+        with pytest.raises(ValueError, match = "Flow Channel"):
+            reader.getResultsArray(["flow"])
+    with h5py.File(planOutput, "a") as f:
+        del f[STEADY_PATH + "/Cross Sections/Water Surface"]
+    with ResultReader(planOutput) as reader:
+        with pytest.raises(ValueError, match = "Water Surface"):
+            reader.getResultsArray(["maxDepth"])
+
+
+def test_profiles_reordered(planOutput):
+    with ResultReader(planOutput) as reader:
+        res = reader.getResultsArray(["velocity"], [3, 1, 4])
+        assert res.profiles == [3, 1, 4]
+        np.testing.assert_allclose(res["velocity"][:, 0, 1], [3.0, 1.0, 4.0])
+        np.testing.assert_allclose(res["velocity"][:, 2, 1], [3.2, 1.2, 4.2])
+
+
+def test_velocity_dist_drops_errors(planOutput):
+    with ResultReader(planOutput) as reader:
+        api = API(None, reader = reader)
+        assert list(api.data.velocityDist("A", "Dn", "100")) == pytest.approx([0.12, 1.2, 0.5])
+        # HEC-RAS error values (1e38) read as 0
+        dist = api.data.velocityDist("A", "Dn", "100", nprofs = 2)
+        assert list(dist[2]) == pytest.approx([0.22, 2.2, 0.0])
+
+
+def test_time_series_window(planOutput):
+    with ResultReader(planOutput) as reader:
+        parts = list(reader.iterTimeSeries(["wse", "velocity"], "A", start = 2, end = 9, chunk = 3))
+        assert [list(part.steps) for part in parts] == [[2, 3, 4], [5, 6, 7], [8]]
+        assert parts[0].times == ["01JAN2000 0200", "01JAN2000 0300", "01JAN2000 0400"]
+        assert parts[0]["wse"].shape == (3, 3)
+        # Error values read as 0
+        np.testing.assert_allclose(parts[0]["velocity"][:, 1], [1.2, 1.3, 0.0])
+        whole = reader.getTimeSeries(["flow"], "A", "Dn", start = -3)
+        assert list(whole.steps) == [7, 8, 9]
+        np.testing.assert_allclose(whole["flow"][:, 0], [8002.0, 9002.0, 10002.0])
+        assert len(reader.getTimeSeries(start = 20)) == 0
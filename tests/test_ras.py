@@ -0,0 +1,218 @@
+"""
+Tests of Ras and the API against the fake HEC-RAS controller (raspy_auto.ras.fake), asserting behaviour and the COM
+calls made.
+"""
+
+import os
+
+import pytest
+
+from raspy_auto.api.api import API, ComputeFailed
+from raspy_auto.bench import main, makeProject, runBenchmarks
+from raspy_auto.ras.fake import FakeController
+from raspy_auto.ras.ras import Ras
+from raspy_auto.ras.store import ResultStore
+from raspy_auto.ras.trace import RecordingController, ReplayController, TraceMismatch
+from raspy_auto.ras.wrapper import RasObject
+
+ERROR = 1e38
+# COM call budgets of the benchmarks (see bench.py) on a model of 10 cross sections and 3 profiles
+BUDGETS = {"modifyN": 20, "modifyN (batch)": 11, "modifyN (unchanged)": 0, "compute": 2, "data.velocity": 30,
+           "data.stage": 60, "data.shear": 90, "getResultsArray": 150, "getLCRSimData (pipeline)": 150,
+           "data.shear (memoized)": 0}
+
+
+def makeAPI(tmp_path, controller, geomCache = False):
+    ras = Ras(makeProject(str(tmp_path)), rasObject = RasObject(ras = controller), geomCache = geomCache)
+    controller.calls.clear()
+    return API(ras)
+
+
+def test_results_fetched_once_per_compute(tmp_path):
+    controller = FakeController(xs = 40, profiles = 10)
+    api = makeAPI(tmp_path, controller)
+    first = api.data.velocity(nprofs = 10)
+    for name in ["stage", "shear", "velocity", "velocityDist", "allFlowDist"]:
+        getattr(api.data, name)(nprofs = 10)
+    # One Output_VelDist per cross section and profile, and Output_NodeOutput for max depth and 3 shears
+    assert controller.calls["Output_VelDist"] == 400
+    assert controller.calls["Output_NodeOutput"] == 400 * 4
+    assert api.data.velocity(nprofs = 10) == first
+    api.ops.compute()
+    controller.calls.clear()
+    api.data.velocity(nprofs = 10)
+    assert controller.calls["Output_VelDist"] == 400
+
+
+def test_results_invalidated_by_changes(tmp_path):
+    controller = FakeController(xs = 5)
+    api = makeAPI(tmp_path, controller)
+    river, reach = api.ras.reachKeys()[0]
+    before = api.data.velocity(river, reach, "500")
+    api.params.modifyN(0.05, river, reach)
+    assert api.data.velocity(river, reach, "500") < before
+    calls = controller.calls["Output_VelDist"]
+    api.data.velocity(river, reach, "500")
+    assert controller.calls["Output_VelDist"] == calls
+    api.ras.openProject(api.ras.currentProject())
+    api.data.velocity(river, reach, "500")
+    assert controller.calls["Output_VelDist"] == calls + 1
+
+
+@pytest.mark.parametrize("count", [1, 10, 11, 21])
+def test_steady_flows_written_in_full(tmp_path, count):
+    pytest.importorskip("pyrasfile")
+    controller = FakeController(xs = 5)
+    api = makeAPI(tmp_path, controller)
+    flows = [10.0 * (i + 1) for i in range(count)]
+    assert api.params.setSteadyFlows("River 1", "Reach 1", None, flows)
+    # The fake controller reads the flows back from the file when the project is reopened
+    assert controller.flows == flows
+    assert not api.params.setSteadyFlows("River 1", "Reach 1", None, flows)
+
+
+def test_failed_compute_not_stored(tmp_path):
+    controller = FakeController(xs = 5)
+    ras = Ras(makeProject(str(tmp_path)), rasObject = RasObject(ras = controller), geomCache = False)
+    api = API(ras, store = ResultStore(str(tmp_path / "results.sqlite")))
+    compute = controller.Compute_CurrentPlan
+    controller.Compute_CurrentPlan = lambda *args: (False, 1, ("Error reading the flow file",), False)
+    with pytest.raises(ComputeFailed, match = "Error reading the flow file"):
+        api.data.computeResults(["velocity"])
+    assert api.data.store.size()[0] == 0
+    controller.Compute_CurrentPlan = compute
+    first = api.data.computeResults(["velocity"])
+    assert api.data.store.size()[0] == 1
+    controller.calls.clear()
+    assert (api.data.computeResults(["velocity"])["velocity"] == first["velocity"]).all()
+    assert controller.calls["Compute_CurrentPlan"] == 0
+
+
+def test_single_slice_padding_and_errors(tmp_path):
+    controller = FakeController(xs = 3)
+    api = makeAPI(tmp_path, controller)
+    velDist = controller.Output_VelDist
+    nodeOutput = controller.Output_NodeOutput
+
+    def channelOnly(riv, rch, n, updn, prof):
+        # Flow distribution with only the channel slice
+        return tuple(field[1:2] if isinstance(field, tuple) else field for field in velDist(riv, rch, n, updn, prof))
+
+    def overbankErrors(riv, rch, n, updn, prof, nVar):
+        result = nodeOutput(riv, rch, n, updn, prof, nVar)
+        return (ERROR,) + result[1:] if nVar in (151, 153) else result
+    controller.Output_VelDist = channelOnly
+    controller.Output_NodeOutput = overbankErrors
+    res = api.ras.getResultsArray(["velocity", "flow", "shear"])
+    expected = velDist(1, 1, 1, 0, 1)
+    assert list(res["velocity"][0, 0]) == [0.0, expected[-1][1], 0.0]
+    assert list(res["flow"][0, 0]) == [0.0, expected[-3][1], 0.0]
+    assert (res["shear"][..., [0, 2]] == 0).all() and (res["shear"][..., 1] > 0).all()
+
+
+def test_unassignable_slices_rejected(tmp_path):
+    controller = FakeController(xs = 3)
+    api = makeAPI(tmp_path, controller)
+    velDist = controller.Output_VelDist
+    controller.Output_VelDist = lambda *args: tuple(field * 2 if isinstance(field, tuple) and len(field) == 3
+                                                    else field for field in velDist(*args))
+    with pytest.raises(ValueError, match = "6 flow distribution slices"):
+        api.data.velocityDist(nprofs = 1)
+
+
+def test_batch_saves_once(tmp_path):
+    controller = FakeController(xs = 10)
+    api = makeAPI(tmp_path, controller)
+    river, reach = api.ras.reachKeys()[0]
+    with api.params.batch() as batch:
+        api.params.modifyN(0.04, river, reach)
+        api.params.modifyN([[0.05, 0.03, 0.05]] * 10, river, reach)
+        # Queued, not yet written
+        assert controller.calls["Geometry_SetMann_LChR"] == 0
+    assert controller.calls["Geometry_SetMann_LChR"] == 10
+    assert controller.calls["Project_Save"] == 1
+    assert (batch.writes, batch.saves) == (10, 1)
+    assert controller.manning[(river, reach, "1000")] == (0.05, 0.03, 0.05)
+
+
+def test_unchanged_roughness_skipped(tmp_path):
+    controller = FakeController(xs = 10)
+    api = makeAPI(tmp_path, controller)
+    river, reach = api.ras.reachKeys()[0]
+    assert api.params.modifyN(0.04, river, reach) == {"written": 10, "skipped": 0}
+    controller.calls.clear()
+    assert api.params.modifyN(0.04, river, reach) == {"written": 0, "skipped": 10}
+    assert sum(controller.calls.values()) == 0
+    assert api.params.modifyN({"500": 0.05}, river, reach) == {"written": 1, "skipped": 0}
+    assert controller.calls["Geometry_SetMann_LChR"] == 1
+
+
+def test_topology_cache(tmp_path):
+    projectPath = makeProject(str(tmp_path))
+    geomPath = os.path.join(str(tmp_path), "bench.g01")
+    with open(geomPath, "w") as f:
+        f.write("Geom Title=bench\n")
+
+    def load():
+        controller = FakeController(rivers = 2, reaches = 2, xs = 5)
+        ras = Ras(projectPath, rasObject = RasObject(ras = controller))
+        stations = [xs.rs for xs in ras.reach("River 1", "Reach 2").xses]
+        return controller, ras, stations
+    controller, ras, stations = load()
+    assert controller.calls["Geometry_GetNodes"] == 1
+    assert os.path.isfile(geomPath + ".raspy.json")
+    # The cached reach is reused; other reaches are fetched and added to the cache
+    controller, ras, cached = load()
+    assert cached == stations
+    assert sum(controller.calls[m] for m in ["Geometry_GetRivers", "Geometry_GetReaches", "Geometry_GetNodes"]) == 0
+    ras.reach("River 2", "Reach 1").xses
+    assert controller.calls["Geometry_GetNodes"] == 1
+    controller, ras, cached = load()
+    ras.reach("River 2", "Reach 1").xses
+    assert controller.calls["Geometry_GetNodes"] == 0
+    # A changed geometry file invalidates the cache
+    with open(geomPath, "a") as f:
+        f.write("Type RM Length L Ch R = 1 ,500\n")
+    controller, ras, cached = load()
+    assert controller.calls["Geometry_GetRivers"] == 1
+    assert controller.calls["Geometry_GetNodes"] == 1
+
+
+def traceWorkload(projectPath, controller):
+    api = API(Ras(projectPath, rasObject = RasObject(ras = controller)))
+    river, reach = api.ras.reachKeys()[0]
+    before = api.data.velocity(river, reach, nprofs = 2)
+    api.params.modifyN(0.05, river, reach)
+    api.ops.compute()
+    return before, api.data.velocity(river, reach, nprofs = 2)
+
+
+@pytest.mark.parametrize("strict", [False, True])
+def test_trace_replay(tmp_path, strict):
+    projectPath = makeProject(str(tmp_path))
+    with open(os.path.join(str(tmp_path), "bench.g01"), "w") as f:
+        f.write("Geom Title=bench\n")
+    tracePath = str(tmp_path / "run.trace.gz")
+    with RecordingController(tracePath, FakeController(xs = 5, profiles = 2)) as recorder:
+        recorded = traceWorkload(projectPath, recorder)
+    # No topology cache is written while recording, so the replay needs nothing but the trace
+    assert not os.path.exists(os.path.join(str(tmp_path), "bench.g01.raspy.json"))
+    replay = ReplayController(tracePath, strict = strict)
+    assert traceWorkload(projectPath, replay) == recorded
+    # Read before and after the compute
+    assert replay.calls["Output_VelDist"] == 2 * 5 * 2
+    with pytest.raises(TraceMismatch):
+        replay.Output_VelDist(9, 9, 9, 0, 1)
+
+
+def test_benchmark_budgets(capsys):
+    pytest.importorskip("pyrasfile")
+    results = {res.name: res for res in runBenchmarks(xs = 10, profiles = 3)}
+    over = {name: results[name].totalCalls() for name, budget in BUDGETS.items()
+            if results[name].totalCalls() > budget}
+    assert over == {}
+    assert results["modifyN (batch)"].calls["Project_Save"] == 1
+    assert results["Ras()"].calls.get("Geometry_GetNodes", 0) == 0
+    assert main(["--xs", "10", "--profiles", "3", "--max-calls", "data.velocity=30"]) == 0
+    assert main(["--xs", "10", "--profiles", "3", "--max-calls", "data.velocity=29"]) == 1
+    assert "data.velocity exceeded" in capsys.readouterr().err